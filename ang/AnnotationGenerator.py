@@ -20,26 +20,59 @@
 ###################################################################
 
 import copy
-import sys
 import re
 import datetime
+import threading
+import multiprocessing
+import Queue
+from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from pluginbase import PluginBase
 from ang import HandlerRepository
+from ang.Config import Config
+from ang.EventCache import CachedInput
+from ang.ResultCache import ResultCache, handler_fingerprint
+from ang.ChannelIndex import ChannelIndex, build_index, exact_pattern
+from ang.Progress import ProgressReporter, progress_pass
+from ang.Prefetch import PrefetchedEvents
+from ang.Profiling import Profiler, clock
+from ang.Sharding import split_time_range, stitch_tiers
+from ang.Tier import Tier, as_tiers, to_nanoseconds
+from ang.rsbhelpers import Deserializer
 import logging
 
 __author__ = 'Viktor Richter'
 
 logger = logging.getLogger(__name__)
 
+# outputs declare their kind with a kind attribute. transforms return the data for the following outputs,
+# sinks only read the data and may run concurrently
+TRANSFORM = 'transform'
+SINK = 'sink'
+
 class Plugin(object):
-    def __init__(self, name, module, config):
+    def __init__(self, name, module, config, key=None):
         self.__name = name
         self.__plugin = module
         self.__config = config
+        self.__key = key
+        self.__profiler = None
 
     def name(self):
         return self.__name
 
+    def key(self):
+        # the option name from the config file identifies a plugin instance
+        return self.__key or self.__name
+
+    def profiler(self):
+        return self.__profiler
+
+    def set_profiler(self, profiler):
+        self.__profiler = profiler
+        if hasattr(self.plugin(), 'set_profiler'):
+            self.plugin().set_profiler(profiler, self.key())
+
     def plugin(self):
         return self.__plugin
 
@@ -55,26 +88,99 @@ class Input(Plugin):
     def __init__(self, name, plugin, config):
         super(Input, self).__init__(name, plugin, config)
 
+    def estimated_count(self, prov):
+        # inputs may provide a cheap estimate of their number of events. it is only used for progress reports
+        if not hasattr(prov, 'estimated_count'):
+            return None
+        return prov.estimated_count()
+
+    def events(self, prov):
+        if self.profiler() is None:
+            return prov.events()
+        return self.profiler().timed(prov.events(), 'input', self.key(), 'next_event')
+
+    def set_time_range(self, start, end):
+        # inputs which can seek skip the events outside of the range. returns False when all events are read
+        if not hasattr(self.plugin(), 'set_time_range'):
+            return False
+        self.plugin().set_time_range(start, end)
+        return True
+
 
 class Output(Plugin):
-    def __init__(self, name, plugin, config):
-        super(Output, self).__init__(name, plugin, config)
+    def __init__(self, name, plugin, config, key=None):
+        super(Output, self).__init__(name, plugin, config, key)
 
     def process(self, data):
         if data is None or len(data) == 0:
             logger.warn('Generated data is none or empty. Skipping output processing for {}'.format(self.name()))
             return
+        start = clock()
         try:
             return self.plugin().process(data)
         except Exception as e:
             logger.exception('Output "{}" fails processing data. Error: "{}"'.format(self.name(), str(e)))
+        finally:
+            if self.profiler() is not None:
+                self.profiler().record('output', self.key(), 'process', clock() - start)
+
+    def is_sink(self):
+        return getattr(self.plugin(), 'kind', TRANSFORM) == SINK
+
+    def supports_streaming(self):
+        return hasattr(self.plugin(), 'add_annotation')
+
+    def open_stream(self):
+        try:
+            return self.plugin().open_stream()
+        except Exception as e:
+            logger.exception('Output "{}" fails opening stream. Error: "{}"'.format(self.name(), str(e)))
+
+    def add_annotation(self, tier_name, annotation):
+        start = clock()
+        try:
+            return self.plugin().add_annotation(tier_name, annotation)
+        except Exception as e:
+            logger.exception('Output "{}" fails adding annotation to tier "{}". Error: "{}"'
+                             .format(self.name(), tier_name, str(e)))
+        finally:
+            if self.profiler() is not None:
+                self.profiler().record('output', self.key(), 'add_annotation', clock() - start)
+
+    def close_stream(self):
+        start = clock()
+        try:
+            return self.plugin().close_stream()
+        except Exception as e:
+            logger.exception('Output "{}" fails closing stream. Error: "{}"'.format(self.name(), str(e)))
+        finally:
+            if self.profiler() is not None:
+                self.profiler().record('output', self.key(), 'close_stream', clock() - start)
+
+    def flush_stream(self):
+        if not hasattr(self.plugin(), 'flush_stream'):
+            return
+        start = clock()
+        try:
+            return self.plugin().flush_stream()
+        except Exception as e:
+            logger.exception('Output "{}" fails flushing stream. Error: "{}"'.format(self.name(), str(e)))
+        finally:
+            if self.profiler() is not None:
+                self.profiler().record('output', self.key(), 'flush_stream', clock() - start)
+
+
+# put into a handler queue to stop its worker
+STOP_WORKER = object()
 
 
 class Handle(Plugin):
-    def __init__(self, channel, plugin, config):
-        super(Handle, self).__init__(config.get('name','unnamed'), plugin, config)
+    def __init__(self, channel, plugin, config, key=None):
+        super(Handle, self).__init__(config.get('name','unnamed'), plugin, config, key)
         self.__channel = channel
         self.__channel_pattern = re.compile(channel)
+        self.__queue = None
+        self.__worker = None
 
     def match(self, channel):
         if self.__channel_pattern.search(channel):
@@ -85,22 +191,101 @@ class Handle(Plugin):
     def channel(self):
         return self.__channel
 
+    def message_type(self):
+        # handlers with a message type accept events decoded by the dispatch loop
+        if not hasattr(self.plugin(), 'message_type'):
+            return None
+        return self.plugin().message_type()
+
+    def set_sink(self, sink):
+        # returns whether the handler is able to pass on closed annotations before finish()
+        if not hasattr(self.plugin(), 'set_sink'):
+            return False
+        self.plugin().set_sink(sink)
+        return True
+
+    def stitch(self, head, tail):
+        if hasattr(self.plugin(), 'stitch'):
+            return self.plugin().stitch(head, tail)
+        # without further knowledge only the end times of window edges can be chained
+        return stitch_tiers(head, tail, combine_repeated=False)
+
+    def supports_shards(self):
+        # handlers may have state which can not be joined across time windows
+        if not hasattr(self.plugin(), 'supports_shards'):
+            return True
+        return self.plugin().supports_shards()
+
+    def start_worker(self, queue_size):
+        # events are handled in order on a separate thread. add_event blocks while the queue is full
+        self.__queue = Queue.Queue(maxsize=queue_size)
+        self.__worker = threading.Thread(target=self.__work, name='handler-{}'.format(self.name()))
+        self.__worker.daemon = True
+        self.__worker.start()
+
+    def stop_worker(self):
+        if self.__worker is None:
+            return
+        self.__queue.put(STOP_WORKER)
+        self.__worker.join()
+        self.__worker = None
+        self.__queue = None
+
+    def __work(self):
+        while True:
+            item = self.__queue.get()
+            if item is STOP_WORKER:
+                return
+            self.__add_event(*item)
+
     def finish(self):
+        self.stop_worker()
+        start = clock()
         try:
-            return self.plugin().finish()
+            if hasattr(self.plugin(), 'statistics'):
+                logger.info('handler {} statistics: {}'.format(self.key(), self.plugin().statistics()))
+            return as_tiers(self.plugin().finish())
         except Exception as e:
             logger.exception('Hander "{}" on channel "{}" does not want to finish. Error: "{}"'.format(self.name(), self.channel(), str(e)))
-
-    def add_event(self, event):
+        finally:
+            if self.profiler() is not None:
+                self.profiler().record('handler', self.key(), 'finish', clock() - start)
+
+    def add_event(self, event, channel=None, decoded=None):
+        if self.__queue is not None:
+            self.__queue.put((event, channel, decoded))
+        elif self.profiler() is not None:
+            self.__add_event(event, channel, decoded)
+        else:
+            try:
+                if decoded is not None:
+                    self.plugin().set_decoded(event, decoded)
+                return self.plugin().add_event(event)
+            except Exception as e:
+                self.__log_add_event_error(event, e)
+
+    def __add_event(self, event, channel, decoded):
+        start = clock()
         try:
+            if decoded is not None:
+                self.plugin().set_decoded(event, decoded)
             return self.plugin().add_event(event)
         except Exception as e:
-            logger.exception('Hander "{}" on channel "{}" throws while adding event "{}". Error: "{}"'.format(self.name(), self.channel(), str(event),  str(e)))
+            self.__log_add_event_error(event, e)
+        finally:
+            if self.profiler() is not None:
+                self.profiler().record('handler', self.key(), 'add_event', clock() - start,
+                                       ':'.join(channel) if channel else None)
+
+    def __log_add_event_error(self, event, e):
+        logger.exception('Hander "{}" on channel "{}" throws while adding event "{}". Error: "{}"'.format(self.name(), self.channel(), str(event),  str(e)))
 
 
 def init_data_provider(plugin_source, config):
     try:
         input_plugin = plugin_source.load_plugin(config.input())
+        if config.get_optional('base', 'cache-directory') is not None:
+            return Input(config.input(), CachedInput(lambda: input_plugin.create(config), config), config)
         return Input(config.input(), input_plugin.create(config), config)
     except ImportError as error:
         logger.warning('Could not find plugin named "' + config.input() + '" in plugin path.\n' \
@@ -108,7 +293,9 @@ def init_data_provider(plugin_source, config):
         raise
 
 
-def init_data_handlers(plugin_source, config, handler_repository=HandlerRepository.HandlerRepository()):
+def init_data_handlers(plugin_source, config, handler_repository=None):
+    if handler_repository is None:
+        handler_repository = HandlerRepository.HandlerRepository()
     for key, value in config.handler().iteritems():
         if 'name' not in value:
             raise ImportError('Cannot import plugin without name field: '+str(value))
@@ -116,7 +303,7 @@ def init_data_handlers(plugin_source, config, handler_repository=HandlerReposito
             raise ImportError('Cannot import plugin without channel field: '+str(value))
         try:
             handler = plugin_source.load_plugin(value['name'])
-            handler_repository.add_handle(Handle(value['channel'], handler.create(config, value), value))
+            handler_repository.add_handle(Handle(value['channel'], handler.create(config, value), value, key))
         except ImportError as error:
             logger.warning('Could not find handler plugin named "' + value['name'] + '" in plugin path.\n' \
                   'Handler plugins search path: ' + str(config.plugin_path_handler()))
@@ -129,7 +316,7 @@ def init_outputs(plugin_source, config):
     outputs = []
     for key, value in config.output().iteritems():
         try:
-            outputs.append(Output(value['name'], plugin_source.load_plugin(value['name']).create(config, value), value))
+            outputs.append(Output(value['name'], plugin_source.load_plugin(value['name']).create(config, value), value, key))
         except ImportError as error:
             logger.warning('Could not find output plugin named "' + value['name'] + '" in plugin path.\n' \
                   'Output plugins search path: ' + str(config.plugin_path_output()))
@@ -137,13 +324,21 @@ def init_outputs(plugin_source, config):
     return outputs
 
 
-def update_callback_pass(message):
-    pass
+def decode_plan(handlers):
+    # handler -> message type for the handlers sharing their message type with another one
+    by_type = {}
+    for handler in handlers:
+        message_type = handler.message_type()
+        if message_type is not None:
+            by_type.setdefault(message_type, []).append(handler)
+    return dict((handler, message_type) for message_type, sharing in by_type.iteritems() if len(sharing) > 1
+                for handler in sharing)
 
 
-def update_callback_print(message):
-    logger.info('\r>> ' + message)
-    sys.stdout.flush()
+def timed_process(output, data):
+    start = clock()
+    result = output.process(data)
+    return result, clock() - start
 
 
 def get_event_time(event):
@@ -154,25 +349,121 @@ def add_handler_channels(config, handles):
     channels = config.get_eval('base', 'channel')
     if channels is None:
         channels = []
+    configured = list(channels)
     for handle in handles:
         if handle.channel() not in channels:
             channels.append(handle.channel())
     if len(channels) == 0:
         channels = None
+    index = ChannelIndex.load(config.get_optional('base', 'input-file'))
+    if index is not None and len(handles) > 0:
+        channels = indexed_channels(index, handles, configured)
     config.set('base', 'channel', str(channels))
 
 
+def indexed_channels(index, handles, configured):
+    # exact names of the configured channels and the channels with at least one handler. reports the expected work
+    patterns = [re.compile(channel) for channel in configured]
+    selected = [name for name in index.names() if any(handle.match(name) for handle in handles)
+                or any(pattern.search(name) for pattern in patterns)]
+    for handle in handles:
+        matched = [name for name in selected if handle.match(name)]
+        if len(matched) == 0:
+            logger.warning('handler {} matches no channel of the input file'.format(handle.key()))
+        else:
+            logger.info('handler {} will get {} events from channels {}'.format(handle.key(), index.count(matched),
+                                                                               matched))
+    logger.info('reading {} events from {} of {} channels'.format(index.count(selected), len(selected),
+                                                                  len(index.names())))
+    if len(selected) == 0:
+        # an empty list would select every channel
+        return ['^$']
+    return [exact_pattern(name) for name in selected]
+
+
+def build_channel_index(config):
+    # reads all channels of the configured input file and writes the sidecar index next to it
+    plugin_source = PluginBase(package='ang.input').make_plugin_source(searchpath=config.plugin_path_input())
+    config.set('base', 'channel', 'None')
+    provider = init_data_provider(plugin_source, config)
+    with provider.plugin() as prov:
+        index = build_index(prov)
+    return index, index.store(config.input_file())
+
+
+def start_time_delta(config):
+    return datetime.timedelta(milliseconds=float(config.get('base', 'start-time-ms')))
+
+
+def configured_window(config):
+    # start-time and end-time are seconds in the time of the annotations, i.e. relative to start-time-ms
+    delta = start_time_delta(config)
+    start = config.get_optional('base', 'start-time')
+    end = config.get_optional('base', 'end-time')
+    if start is not None and end is not None and float(end) <= float(start):
+        raise Exception('end-time {} must be after start-time {}'.format(end, start))
+    return (None if start is None else delta + datetime.timedelta(seconds=float(start)),
+            None if end is None else delta + datetime.timedelta(seconds=float(end)))
+
+
+def intersect_windows(first, second):
+    starts = [start for start in (first[0], second[0]) if start is not None]
+    ends = [end for end in (first[1], second[1]) if end is not None]
+    return max(starts) if starts else None, min(ends) if ends else None
+
+
+def adapt_time(elem, delta):
+    elem['start'] = elem['start']-delta
+    elem['end'] = elem['end']-delta
+
+
 def adapt_times(tiers, config):
-    delta = datetime.timedelta(milliseconds=float(config.get('base', 'start-time-ms')))
+    delta = to_nanoseconds(start_time_delta(config))
     for tier, value in tiers.iteritems():
-        for elem in value:
-            elem['start'] = elem['start']-delta
-            elem['end'] = elem['end']-delta
+        value.offset(-delta)
+
+
+def finish_handler(handler, last_event_time, reporter):
+    reporter.phase('finish handler {} on channels {}'.format(handler.name(), handler.channel()))
+    return compact_handler_data(handler.finish() or {}, last_event_time)
+
+
+def compact_handler_data(data, last_event_time):
+    for tier, values in data.iteritems():
+        # skip empty tiers
+        if len(values) == 0:
+            logger.warn('tier {} is empty'.format(tier))
+            continue
+        # set start/end times for edge events
+        if not values.has_end(-1) and last_event_time is not None:
+            values.set_end(-1, to_nanoseconds(last_event_time))
+        yield tier, values
+
+
+def collect_tiers(tiers, handler_data):
+    for tier, values in handler_data:
+        if tier in tiers:
+            tiers[tier].extend(values)
+        else:
+            tiers[tier] = values
+    return tiers
+
+
+def read_window(arguments):
+    # runs in a separate process: handler key -> data of the given handlers in one time window of the recording.
+    # the parent process decides which handler results are cached
+    config_text, window, handler_keys = arguments
+    config = Config()
+    config.read_string(config_text)
+    config.set('base', 'result-cache-directory', None)
+    generator = AnnotationGenerator(config, handler_keys)
+    data, last_event_time = generator.read_window_data(window)
+    return data, last_event_time, generator.profiler()
 
 
 class AnnotationGenerator(object):
     # setup data provider and handlers
-    def __init__(self, config):
+    def __init__(self, config, handler_keys=None):
         self.__config = config
         self.__plugin_base_input = PluginBase(package='ang.input')
         self.__plugin_source_input = self.__plugin_base_input.make_plugin_source(searchpath=config.plugin_path_input())
@@ -182,16 +473,100 @@ class AnnotationGenerator(object):
         self.__plugin_source_output = self.__plugin_base_output.make_plugin_source(searchpath=config.plugin_path_output())
         # init handlers
         self.__handlers_repo = init_data_handlers(self.__plugin_source_handler, config)
-        # add handler channels to data provider before initialization
+        configured_channels = config.get('base', 'channel')
+        # add handler channels to data provider before initialization. cached handlers keep their channels
+        # so the last event time stays the same
         add_handler_channels(config, self.__handlers_repo.get_all_handles())
+        if handler_keys is not None:
+            repository = HandlerRepository.HandlerRepository()
+            for handle in self.__handlers_repo.get_all_handles():
+                if handle.key() in handler_keys:
+                    repository.add_handle(handle)
+            self.__handlers_repo = repository
+        self.__result_cache = None
+        self.__fingerprints = {}
+        self.__cached_handlers = []
+        # handler key -> (data, last event time) of the cached handlers
+        self.__cached_results = {}
+        if config.get_optional('base', 'result-cache-directory') is not None:
+            self.__result_cache = ResultCache(config.get('base', 'result-cache-directory'))
+            self.__handlers_repo = self.__split_cached_handlers(configured_channels)
         self.__provider = init_data_provider(self.__plugin_source_input, config)
+        self.__window = configured_window(config)
+        if self.__window != (None, None) and not self.__provider.set_time_range(*self.__window):
+            logger.info('input {} can not seek. skipping events outside of the time range'.format(config.input()))
         self.__outputs = init_outputs(self.__plugin_source_output, config)
+        self.__output_threads = int(config.get('base', 'output-threads'))
+        self.__output_timings = OrderedDict()
+        self.__shards = int(config.get('base', 'shards'))
+        self.__handler_threads = config.get_eval('base', 'handler-threads')
+        self.__handler_queue_size = int(config.get('base', 'handler-queue-size'))
+        self.__progress_interval = float(config.get('base', 'progress-interval'))
+        self.__prefetch_depth = int(config.get_optional('base', 'prefetch-depth') or 0)
+        self.__prefetch_bytes = config.get_optional('base', 'prefetch-mb')
+        if self.__prefetch_bytes is not None:
+            self.__prefetch_bytes = int(float(self.__prefetch_bytes) * 1024 * 1024)
+        self.__prefetch_statistics = None
+        # per channel: handler -> message type for the types read by more than one handler
+        self.__decode_plans = {}
+        self.__decoders = {}
+        self.__decode_statistics = dict(decoded=0, reused=0, failed=0)
+        self.__profile_output = config.get_optional('base', 'profile-output')
+        self.__profiler = None
+        if self.__profile_output is not None:
+            self.__profiler = Profiler()
+            self.__provider.set_profiler(self.__profiler)
+            for handle in self.__handlers_repo.get_all_handles():
+                handle.set_profiler(self.__profiler)
+            for output in self.__outputs:
+                output.set_profiler(self.__profiler)
         self.__max_events = config.get('base', 'number-events')
         if self.__max_events is None:
             self.__max_events = -1
         else:
             self.__max_events = int(self.__max_events)
 
+    # moves handlers with cached results out of the repository used for dispatching
+    def __split_cached_handlers(self, configured_channels):
+        repository = HandlerRepository.HandlerRepository()
+        for handle in self.__handlers_repo.get_all_handles():
+            fingerprint = handler_fingerprint(self.__config, configured_channels, handle)
+            self.__fingerprints[handle.key()] = fingerprint
+            cached = self.__result_cache.load(fingerprint) if self.__result_cache.contains(fingerprint) else None
+            if cached is not None:
+                self.__cached_handlers.append(handle)
+                self.__cached_results[handle.key()] = cached
+            else:
+                if self.__result_cache.contains(fingerprint):
+                    # replaced by the result of this run
+                    logger.warning('discarding unreadable cached result of handler {}'.format(handle.key()))
+                    self.__result_cache.discard(fingerprint)
+                repository.add_handle(handle)
+        if len(self.__cached_handlers) > 0:
+            logger.info('using cached results for handlers {}'.format([h.key() for h in self.__cached_handlers]))
+        return repository
+
+    # unfinished data of the cached handlers and the last event time of the run which produced them
+    def cached_results(self):
+        results = []
+        last_event_time = None
+        for handle in self.__cached_handlers:
+            cached = self.__cached_results[handle.key()]
+            results.append(cached[0])
+            last_event_time = cached[1]
+        return results, last_event_time
+
+    def store_result(self, handler, data, last_event_time):
+        if self.__result_cache is not None and data is not None:
+            self.__result_cache.store(self.__fingerprints[handler.key()], data, last_event_time)
+
+    # finishes the handler, caches its data and fills the open end times
+    def finish_handler(self, handler, last_event_time, reporter):
+        reporter.phase('finish handler {} on channels {}'.format(handler.name(), handler.channel()))
+        data = handler.finish()
+        self.store_result(handler, data, last_event_time)
+        return compact_handler_data(data or {}, last_event_time)
+
     def validate_setup(self):
         errors = []
 
@@ -212,47 +587,338 @@ class AnnotationGenerator(object):
                       '\nType: {}\nConfig: {}\nError: {}'.format(error[0], error[1], error[2]))
             raise Exception('could not validate plugin configuration')
 
-    # read annotations from file
-    def read_all_data(self, update_callback=update_callback_pass):
+    # read events and pass them to the matching handlers. returns the time of the last event
+    # when a (start, end) window is passed only events within are handled. events are expected in time order.
+    # tick is called after every event and whenever a live input reports that nothing arrived.
+    def dispatch_events(self, reporter=None, window=(None, None), tick=None):
+        if reporter is None:
+            reporter = ProgressReporter()
+        if len(self.__handlers_repo.get_all_handles()) == 0 and len(self.__cached_handlers) > 0:
+            logger.info('all handler results are cached. not reading the input')
+            return self.cached_results()[1]
+        start, end = intersect_windows(window, self.__window)
+        if self.__handler_threads:
+            for handler in self.__handlers_repo.get_all_handles():
+                handler.start_worker(self.__handler_queue_size)
+        try:
+            return self.__dispatch_events(reporter, start, end, tick)
+        finally:
+            for handler in self.__handlers_repo.get_all_handles():
+                handler.stop_worker()
+
+    def __dispatch_events(self, reporter, start, end, tick):
         with self.__provider.plugin() as prov:
-            events = prov.events()
-            sum_events = len(events)
-            current_event_number = 0
+            reporter.progress.total_events = self.__provider.estimated_count(prov)
+            events = self.__provider.events(prov)
+            event_size = getattr(prov, 'event_size', None)
+            if self.__prefetch_depth > 0 or self.__prefetch_bytes is not None:
+                events = PrefetchedEvents(events, self.__prefetch_depth, self.__prefetch_bytes, event_size)
             last_event_time =None
-            for event in events:
-                last_event_time = get_event_time(event)
-                current_event_number += 1
-                ch = prov.channel(event)
-                channel = ':'.join(prov.channel(event))
-                handlers = self.__handlers_repo.get_handle(channel)
-                if handlers is not None:
-                    for handler in handlers:
-                        handler.add_event(event)
-                        update_callback('processed event {} of {} on {}'.format(current_event_number, sum_events, channel))
-                if 0 < self.__max_events <= current_event_number:
-                    break
+            try:
+                for event in events:
+                    if event is None:
+                        # live inputs yield None while waiting for events
+                        if tick is not None:
+                            tick()
+                        continue
+                    event_time = get_event_time(event)
+                    if start is not None and event_time < start:
+                        continue
+                    if end is not None and event_time >= end:
+                        break
+                    last_event_time = event_time
+                    channel = prov.channel(event)
+                    handlers = self.__handlers_repo.get_handle(channel)
+                    if handlers is not None:
+                        self.__add_event(handlers, event, channel, event_time)
+                    reporter.event(channel, len(handlers or ()), event_size(event) if event_size else 0)
+                    if 0 < self.__max_events <= reporter.progress.events_read:
+                        break
+                    if tick is not None:
+                        tick()
+            finally:
+                if isinstance(events, PrefetchedEvents):
+                    events.close()
+        reporter.report()
+        logger.info('dispatch statistics: {}'.format(self.__handlers_repo.statistics()))
+        if self.__decode_statistics['decoded'] > 0:
+            logger.info('decode statistics: {}'.format(self.__decode_statistics))
+        if isinstance(events, PrefetchedEvents):
+            # many starved reads mean the input is the bottleneck, many blocked ones the handlers
+            self.__prefetch_statistics = events.statistics()
+            logger.info('prefetch statistics: {}'.format(self.__prefetch_statistics))
+        return last_event_time
+
+    # passes the event to the handlers. messages of types read by several handlers are only decoded once
+    def __add_event(self, handlers, event, channel, event_time):
+        shared = self.__decode_plans.get(channel)
+        if shared is None:
+            shared = self.__decode_plans[channel] = decode_plan(handlers)
+        if len(shared) == 0:
+            for handler in handlers:
+                handler.add_event(event, channel)
+            return
+        decoded = {}
+        for handler in handlers:
+            message_type = shared.get(handler)
+            if message_type is None:
+                handler.add_event(event, channel)
+                continue
+            if message_type in decoded:
+                self.__decode_statistics['reused'] += 1
+            else:
+                decoded[message_type] = self.__decode(message_type, event, event_time)
+            # handlers decode failed events themselves and report the error
+            handler.add_event(event, channel, decoded[message_type])
+
+    def __decode(self, message_type, event, event_time):
+        decoder = self.__decoders.get(message_type)
+        if decoder is None:
+            decoder = self.__decoders[message_type] = Deserializer(message_type)
+            if self.__profiler is not None:
+                decoder.set_profiler(self.__profiler, 'shared')
+        try:
+            message = decoder.deserialize(event)
+        except Exception:
+            self.__decode_statistics['failed'] += 1
+            return None
+        self.__decode_statistics['decoded'] += 1
+        return message, event_time
+
+    # read annotations from file
+    def read_all_data(self, update_callback=progress_pass):
+        reporter = self.progress_reporter(update_callback)
+        last_event_time = self.dispatch_events(reporter)
         # compact data
         tiers = {}
         for handler in self.__handlers_repo.get_all_handles():
-            update_callback('finish handler {} on channels {}'.format(handler.name(), handler.channel()))
-            data = handler.finish() or {}
-            for tier, values in data.iteritems():
-                # skip empty tiers
-                if len(values) == 0:
-                    logger.warn('tier {} is empty'.format(tier))
-                    continue
-                # set start/end times for edge events
-                if 'end' not in values[-1]:
-                    values[-1]['end'] = last_event_time
-                if tier in tiers:
-                    tiers[tier].extend(values)
-                else:
-                    tiers[tier] = values
-        adapt_times(tiers, self.__config)
+            collect_tiers(tiers, self.finish_handler(handler, last_event_time, reporter))
+        self.collect_cached_tiers(tiers, last_event_time)
+        self.adapt_times(tiers)
+        return tiers
+
+    def collect_cached_tiers(self, tiers, last_event_time):
+        for data in self.cached_results()[0]:
+            collect_tiers(tiers, compact_handler_data(data, last_event_time))
         return tiers
 
-    # do post processing
-    def process_data(self, data):
-        for process in self.__outputs:
-            data = process.process(data)
+    # handle one time window. returns the unfinished data by handler key and the last event time
+    def read_window_data(self, window):
+        # inputs which can seek only read the events of the window
+        self.__provider.set_time_range(*intersect_windows(window, self.__window))
+        last_event_time = self.dispatch_events(window=window)
+        return dict((handler.key(), handler.finish() or {}) for handler in self.__handlers_repo.get_all_handles()), \
+            last_event_time
+
+    def time_range(self):
+        with self.__provider.plugin() as prov:
+            if hasattr(prov, 'time_range'):
+                time_range = prov.time_range()
+            else:
+                first = last = None
+                for event in prov.events():
+                    last = get_event_time(event)
+                    if first is None:
+                        first = last
+                time_range = None if first is None else (first, last)
+        if time_range is None:
+            return None
+        first, last = intersect_windows(time_range, self.__window)
+        if last is not None and first > last:
+            return None
+        return first, last
+
+    # read annotations from file using one process per time window
+    def read_sharded_data(self, update_callback=progress_pass):
+        reporter = self.progress_reporter(update_callback)
+        reporter.phase('reading {} time windows'.format(self.__shards))
+        time_range = self.time_range()
+        if time_range is None:
+            return self.read_all_data(update_callback)
+        windows = split_time_range(time_range[0], time_range[1], self.__shards)
+        config_text = self.__config.to_string()
+        handler_keys = [handler.key() for handler in self.__handlers_repo.get_all_handles()]
+        pool = multiprocessing.Pool(self.__shards)
+        try:
+            results = pool.map(read_window, [(config_text, window, handler_keys) for window in windows])
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+        reporter.phase('stitching {} time windows'.format(len(windows)))
+        handlers = self.__handlers_repo.get_all_handles()
+        data = [{} for handler in handlers]
+        last_event_time = None
+        for window_data, window_last_event_time, profiler in results:
+            if profiler is not None:
+                self.__profiler.merge(profiler)
+            for index, handler in enumerate(handlers):
+                data[index] = handler.stitch(data[index], window_data[handler.key()])
+            if window_last_event_time is not None:
+                last_event_time = window_last_event_time
+        tiers = {}
+        for handler, handler_data in zip(handlers, data):
+            self.store_result(handler, handler_data, last_event_time)
+            collect_tiers(tiers, compact_handler_data(handler_data, last_event_time))
+        self.collect_cached_tiers(tiers, last_event_time)
+        self.adapt_times(tiers)
+        return tiers
+
+    # read annotations from file and pass them to the outputs as soon as they are closed
+    def stream_data(self, update_callback=progress_pass):
+        reporter = self.progress_reporter(update_callback)
+        delta = start_time_delta(self.__config)
+        streaming = []
+        for output in self.__outputs:
+            # outputs after a transform need the transformed data
+            if not output.is_sink():
+                break
+            if output.supports_streaming():
+                streaming.append(output)
+        buffered = {}
+        # handlers may run on their own threads
+        lock = threading.Lock()
+
+        def sink(tier_name, annotation):
+            with lock:
+                adapt_time(annotation, delta)
+                for output in streaming:
+                    output.add_annotation(tier_name, annotation)
+                # outputs without streaming support still need all annotations at the end
+                if len(streaming) < len(self.__outputs):
+                    tier = buffered.setdefault(tier_name, Tier())
+                    tier.append(to_nanoseconds(annotation['start']), annotation['label'],
+                                to_nanoseconds(annotation['end']))
+
+        uncached = []
+        for handler in self.__handlers_repo.get_all_handles():
+            if handler.set_sink(sink):
+                # the finished data does not contain the streamed annotations anymore
+                uncached.append(handler)
+            else:
+                logger.info('handler {} does not support streaming. annotations are passed on when finished'
+                            .format(handler.name()))
+        for output in streaming:
+            output.open_stream()
+        last_event_time = self.dispatch_events(reporter, tick=self.flush_timer(streaming, lock))
+        finished = []
+        for handler in self.__handlers_repo.get_all_handles():
+            if handler in uncached:
+                finished.append(finish_handler(handler, last_event_time, reporter))
+            else:
+                finished.append(self.finish_handler(handler, last_event_time, reporter))
+        finished += [compact_handler_data(data, last_event_time) for data in self.cached_results()[0]]
+        for handler_data in finished:
+            for tier, values in handler_data:
+                for value in values:
+                    sink(tier, value)
+        for output in streaming:
+            output.close_stream()
+        return self.process_data(buffered, [output for output in self.__outputs if output not in streaming])
+
+    # returns a function flushing the streaming outputs every flush-interval-s seconds
+    def flush_timer(self, outputs, lock):
+        interval = self.__config.get_optional('base', 'flush-interval-s')
+        if interval is None:
+            return None
+        interval = float(interval)
+        next_flush = [clock() + interval]
+
+        def tick():
+            now = clock()
+            if now < next_flush[0]:
+                return
+            next_flush[0] = now + interval
+            with lock:
+                for output in outputs:
+                    output.flush_stream()
+        return tick
+
+    def progress_reporter(self, update_callback):
+        return ProgressReporter(update_callback, self.__progress_interval)
+
+    def use_shards(self):
+        if self.__shards <= 1:
+            return False
+        if len(self.__handlers_repo.get_all_handles()) == 0:
+            return False
+        if self.__max_events > 0:
+            logger.warning('number-events can not be combined with shards. reading sequentially')
+            return False
+        if multiprocessing.current_process().daemon:
+            logger.warning('cannot start shard processes from a daemon process. reading sequentially')
+            return False
+        for handle in self.__handlers_repo.get_all_handles():
+            if not handle.supports_shards():
+                raise Exception('handler {} can not be read in shards with its configuration. '
+                                'set shards to 1'.format(handle.key()))
+        return True
+
+    def profiler(self):
+        return self.__profiler
+
+    def adapt_times(self, tiers):
+        start = clock()
+        adapt_times(tiers, self.__config)
+        if self.__profiler is not None:
+            self.__profiler.record('generator', 'generator', 'adapt_times', clock() - start)
+
+    # read and process annotations in the configured mode
+    def run(self, update_callback=progress_pass):
+        if self.use_shards():
+            if self.__config.get_eval('base', 'streaming'):
+                logger.warning('streaming is not available when reading in shards')
+            data = self.process_data(self.read_sharded_data(update_callback))
+        elif self.__config.get_eval('base', 'streaming'):
+            data = self.stream_data(update_callback)
+        else:
+            if self.__config.get_optional('base', 'flush-interval-s') is not None:
+                logger.warning('flush-interval-s is only used in streaming mode')
+            data = self.process_data(self.read_all_data(update_callback))
+        if self.__profiler is not None:
+            extra = dict(dispatch=self.__handlers_repo.statistics(), outputs=self.__output_timings,
+                         decoding=self.__decode_statistics)
+            if self.__prefetch_statistics is not None:
+                extra['prefetch'] = self.__prefetch_statistics
+            self.__profiler.dump(self.__profile_output, **extra)
+            logger.info('wrote profile to {}'.format(self.__profile_output))
+        return data
+
+    # pass the data through the transforming outputs in config order. every sink reads the data produced by the
+    # transforms before it. sinks run on a thread pool until the next transform
+    def process_data(self, data, outputs=None):
+        if outputs is None:
+            outputs = self.__outputs
+        sinks = [output for output in outputs if output.is_sink()]
+        pool = None
+        if len(sinks) > 1 and self.__output_threads != 1:
+            pool = ThreadPool(self.__output_threads or len(sinks))
+        pending = []
+        timings = self.__output_timings
+
+        def wait_for_sinks():
+            for output, result in pending:
+                timings[output.key()] = result.get()[1]
+            del pending[:]
+
+        try:
+            for output in outputs:
+                if output.is_sink() and pool is not None:
+                    pending.append((output, pool.apply_async(timed_process, (output, data))))
+                    continue
+                # transforms may change the data the sinks are reading
+                wait_for_sinks()
+                result, timings[output.key()] = timed_process(output, data)
+                if not output.is_sink():
+                    data = result
+            wait_for_sinks()
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        if len(timings) > 0:
+            logger.info('output seconds: {}'.format(', '.join('{}={:.3f}'.format(key, seconds)
+                                                              for key, seconds in timings.iteritems())))
         return data
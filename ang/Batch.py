@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Batch.py                                           #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import glob
+import time
+import logging
+import traceback
+import multiprocessing
+from ang.Config import Config, default_config
+from ang.AnnotationGenerator import AnnotationGenerator
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+
+def expand_inputs(patterns):
+    # keeps the order of the patterns. patterns without matches are kept to be reported as failures
+    inputs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for match in matches:
+            if match not in inputs:
+                inputs.append(match)
+    return inputs
+
+
+def output_name(template, input_file):
+    # available fields: {path}, {dir}, {basename}, {name}, {ext}
+    directory, basename = os.path.split(input_file)
+    name, ext = os.path.splitext(basename)
+    return template.format(path=input_file, dir=directory or '.', basename=basename, name=name, ext=ext)
+
+
+def load_config(config_file, overrides):
+    if config_file is not None:
+        config = Config(config_file)
+    else:
+        config = default_config()
+    config.set_all(overrides)
+    return config
+
+
+def process_file(job):
+    config_file, overrides, input_file, output_file = job
+    result = dict(input=input_file, output=output_file, success=False, error=None, seconds=0., bytes=0)
+    start = time.time()
+    try:
+        result['bytes'] = os.path.getsize(input_file)
+        config = load_config(config_file, overrides)
+        config.set('base', 'input-file', input_file)
+        config.set('base', 'output-file', output_file)
+        generator = AnnotationGenerator(config)
+        generator.validate_setup()
+        generator.run()
+        result['success'] = True
+    except Exception as e:
+        result['error'] = '{}\n{}'.format(str(e), traceback.format_exc())
+    result['seconds'] = time.time() - start
+    return result
+
+
+def report_result_log(result):
+    if result['success']:
+        logger.info('done "{}" -> "{}" in {:.2f}s'.format(result['input'], result['output'], result['seconds']))
+    else:
+        logger.error('failed "{}" after {:.2f}s: {}'.format(result['input'], result['seconds'], result['error']))
+
+
+def summarize(results, seconds):
+    succeeded = [result for result in results if result['success']]
+    processed_bytes = sum(result['bytes'] for result in succeeded)
+    return dict(files=len(results),
+                succeeded=len(succeeded),
+                failed=len(results) - len(succeeded),
+                seconds=seconds,
+                files_per_second=len(succeeded) / seconds if seconds > 0 else 0.,
+                megabytes_per_second=processed_bytes / (1024. * 1024.) / seconds if seconds > 0 else 0.,
+                failures=[result['input'] for result in results if not result['success']])
+
+
+def run_batch(config_file, overrides, inputs, output_template, processes=None, report=report_result_log):
+    jobs = [(config_file, overrides, input_file, output_name(output_template, input_file)) for input_file in inputs]
+    outputs = [job[3] for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise Exception('output template "{}" does not generate unique file names'.format(output_template))
+    results = []
+    start = time.time()
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(process_file, jobs):
+            report(result)
+            results.append(result)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results, summarize(results, time.time() - start)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Benchmark.py                                       #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import json
+import time
+import shutil
+import logging
+import resource
+import tempfile
+import subprocess
+import multiprocessing
+from timeit import default_timer as clock
+from ang.Config import Config
+from ang.AnnotationGenerator import AnnotationGenerator
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+STAGES = ['input', 'handler', 'elan', 'ass']
+OUTPUTS = {
+    'elan': ('generate-elan', 'benchmark.eaf'),
+    'ass': ('generate_ass_persons', 'benchmark.json')
+}
+PLUGINS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'plugins')
+DEFAULT_PARAMETERS = {
+    'events': 20000,
+    'person-channels': 1,
+    'person-rate-hz': 30,
+    'persons': 3,
+    'evidence-channels': 1,
+    'evidence-rate-hz': 10,
+    'variables': 5,
+    'states': 3,
+    'change-probability': 0.05,
+    'seed': 0
+}
+
+
+def benchmark_config(stage, parameters, directory):
+    config = Config()
+    internal = config.internal()
+    for section in ['synthetic', 'handler', 'output']:
+        internal.add_section(section)
+    config.set('base', 'input', 'synthetic')
+    config.set('base', 'channel', '[]')
+    config.set('base', 'plugin-path-input', str([os.path.join(PLUGINS, 'input')]))
+    config.set('base', 'plugin-path-handler', str([os.path.join(PLUGINS, 'handler')]))
+    config.set('base', 'plugin-path-output', str([os.path.join(PLUGINS, 'output')]))
+    for key, value in parameters.iteritems():
+        config.set('synthetic', key, str(value))
+    if stage != 'input':
+        # variable names as generated by the synthetic input plugin
+        variables = dict(('variable{}'.format(number), 'evidence-variable{}'.format(number))
+                         for number in range(int(parameters['variables'])))
+        config.set('handler', 'persons', str({'name': 'rsb_person_hypotheses',
+                                              'channel': '^/synthetic/persons/',
+                                              'tier': 'persons'}))
+        config.set('handler', 'evidence', str({'name': 'rsb_bayes_network_evidence',
+                                               'channel': '^/synthetic/evidence/',
+                                               'variables': variables}))
+    if stage in OUTPUTS:
+        name, filename = OUTPUTS[stage]
+        config.set('output', stage, str({'name': name, 'overwrite-output': 'True'}))
+        config.set('base', 'output-file', os.path.join(directory, filename))
+    return config
+
+
+def peak_rss_mb():
+    # ru_maxrss is reported in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def run_stage(arguments):
+    stage, parameters = arguments
+    directory = tempfile.mkdtemp(prefix='ang-benchmark-')
+    try:
+        generator = AnnotationGenerator(benchmark_config(stage, parameters, directory))
+        generator.validate_setup()
+        if stage in OUTPUTS:
+            tiers = generator.read_all_data()
+            items = sum(len(values) for values in tiers.itervalues())
+            rss_before = peak_rss_mb()
+            start = clock()
+            generator.process_data(tiers)
+        else:
+            items = int(parameters['events'])
+            rss_before = peak_rss_mb()
+            start = clock()
+            generator.read_all_data()
+        seconds = clock() - start
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return dict(items=items,
+                seconds=seconds,
+                items_per_second=items / seconds if seconds > 0 else 0.,
+                peak_rss_mb=peak_rss_mb(),
+                peak_rss_increase_mb=peak_rss_mb() - rss_before)
+
+
+def run_isolated(stage, parameters):
+    # a fresh process per measurement keeps the peak memory of stages apart
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(run_stage, ((stage, parameters),))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(PLUGINS)).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(parameters=None, stages=STAGES, repeat=1):
+    used = dict(DEFAULT_PARAMETERS)
+    for key, value in (parameters or {}).iteritems():
+        used[key] = type(DEFAULT_PARAMETERS[key])(value) if key in DEFAULT_PARAMETERS else value
+    results = {}
+    for stage in stages:
+        runs = [run_isolated(stage, used) for run in range(repeat)]
+        # the fastest run is the least disturbed one
+        results[stage] = max(runs, key=lambda result: result['items_per_second'])
+        logger.info('{}: {items} items in {seconds:.3f}s, {items_per_second:.0f} items/s, '
+                    'peak rss {peak_rss_mb:.1f} MB (+{peak_rss_increase_mb:.1f} MB)'.format(stage, **results[stage]))
+    return dict(created=time.strftime('%Y-%m-%dT%H:%M:%S'),
+                revision=git_revision(),
+                parameters=used,
+                stages=results)
+
+
+def store_results(results, filename):
+    with open(filename, 'w') as outfile:
+        json.dump(results, outfile, sort_keys=True, indent=4, separators=(',', ': '))
+
+
+def load_results(filename):
+    with open(filename) as infile:
+        return json.load(infile)
+
+
+def compare_results(baseline, current, tolerance=0.1):
+    # returns (stage, throughput ratio, peak memory ratio, regression) for every stage found in both
+    if baseline.get('parameters') != current.get('parameters'):
+        logger.warning('benchmark parameters differ from the baseline. results are not comparable')
+    comparison = []
+    for stage, result in sorted(current['stages'].iteritems()):
+        if stage not in baseline['stages']:
+            continue
+        reference = baseline['stages'][stage]
+        speed = result['items_per_second'] / reference['items_per_second'] if reference['items_per_second'] else None
+        memory = result['peak_rss_mb'] / reference['peak_rss_mb'] if reference['peak_rss_mb'] else None
+        regression = (speed is not None and speed < 1. - tolerance) or (memory is not None and memory > 1. + tolerance)
+        comparison.append((stage, speed, memory, regression))
+    return comparison
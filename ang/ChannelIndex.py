@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/ChannelIndex.py                                     #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import re
+import json
+import logging
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.angi'
+VERSION = 1
+
+
+def index_filename(input_file):
+    return input_file + SUFFIX
+
+
+def channel_name(channel):
+    return ':'.join(channel) if isinstance(channel, tuple) else channel
+
+
+def exact_pattern(name):
+    return '^{}$'.format(re.escape(name))
+
+
+def file_stamp(input_file):
+    stat = os.stat(input_file)
+    return [stat.st_size, stat.st_mtime]
+
+
+class ChannelIndex(object):
+    # per channel: number of events, first and last receive time, payload bytes and the
+    # offsets of the chunks containing the channel (for inputs that have chunks)
+    def __init__(self, channels=None, stamp=None):
+        self.channels = channels or {}
+        self.stamp = stamp
+
+    def add(self, channel, time, size=0, chunk=None):
+        name = channel_name(channel)
+        entry = self.channels.get(name)
+        if entry is None:
+            entry = self.channels[name] = dict(count=0, first=time, last=time, bytes=0, chunks=[])
+        entry['count'] += 1
+        entry['first'] = min(entry['first'], time)
+        entry['last'] = max(entry['last'], time)
+        entry['bytes'] += size
+        if chunk is not None and (not entry['chunks'] or entry['chunks'][-1] != chunk):
+            entry['chunks'].append(chunk)
+
+    def names(self):
+        return sorted(self.channels)
+
+    def count(self, names=None):
+        return sum(self.channels[name]['count'] for name in (self.names() if names is None else names))
+
+    def time_range(self, names=None):
+        entries = [self.channels[name] for name in (self.names() if names is None else names)]
+        if len(entries) == 0:
+            return None
+        return min(entry['first'] for entry in entries), max(entry['last'] for entry in entries)
+
+    def chunks(self, names=None):
+        chunks = set()
+        for name in self.names() if names is None else names:
+            chunks.update(self.channels[name]['chunks'])
+        return chunks
+
+    def store(self, input_file):
+        filename = index_filename(input_file)
+        partial = '{}.{}.part'.format(filename, os.getpid())
+        with open(partial, 'w') as outfile:
+            json.dump(dict(version=VERSION, stamp=file_stamp(input_file), channels=self.channels), outfile,
+                      sort_keys=True, indent=1)
+        os.rename(partial, filename)
+        return filename
+
+    @staticmethod
+    def load(input_file):
+        # returns None when there is no index or the input file changed since it was built
+        if input_file is None:
+            return None
+        filename = index_filename(input_file)
+        if not os.path.exists(filename) or not os.path.exists(input_file):
+            return None
+        try:
+            with open(filename) as infile:
+                data = json.load(infile)
+        except Exception as e:
+            logger.warning('ignoring unreadable channel index {}: {}'.format(filename, e))
+            return None
+        if data.get('version') != VERSION or data.get('stamp') != file_stamp(input_file):
+            logger.warning('ignoring outdated channel index {}. please rebuild it'.format(filename))
+            return None
+        return ChannelIndex(dict((str(name), entry) for name, entry in data['channels'].iteritems()), data['stamp'])
+
+
+def build_index(prov):
+    # reads all events of an opened input once. inputs may provide index_entries() to skip decoding
+    index = ChannelIndex()
+    if hasattr(prov, 'index_entries'):
+        for channel, time, size, chunk in prov.index_entries():
+            index.add(channel, time, size, chunk)
+        return index
+    event_size = getattr(prov, 'event_size', None)
+    for event in prov.events():
+        index.add(prov.channel(event), event.getMetaData().userTimes['rsbag:original_receive'],
+                  event_size(event) if event_size else 0)
+    return index
@@ -22,6 +22,7 @@
 import io
 import ast
 import ConfigParser
+from collections import OrderedDict
 
 __author__ = 'Viktor Richter'
 
@@ -47,6 +48,27 @@ class Config(object):
             ('channel', [], 'only matching channels will be processed. channels from handlers will be appended.'),
             ('number-events', None, 'stop after a specific amount of processed events.'),
             ('start-time-ms', 0, 'the start time of the recording in milliseconds. will be subtracted from annotations'),
+            ('start-time', None, 'only annotate events after this many seconds. relative to start-time-ms.'),
+            ('end-time', None, 'only annotate events before this many seconds. relative to start-time-ms.'),
+            ('streaming', 'False', 'pass annotations to the outputs as soon as they are closed instead of '
+                                   'collecting all of them first.'),
+            ('shards', '1', 'split the recording into this many time windows and run the handlers for each window '
+                            'in a separate process.'),
+            ('handler-threads', 'False', 'run every handler on its own thread fed by a bounded event queue.'),
+            ('handler-queue-size', '1000', 'maximum number of queued events per handler thread.'),
+            ('prefetch-depth', '0', 'read up to this many events ahead on a background thread. 0 disables it.'),
+            ('prefetch-mb', None, 'read events ahead on a background thread up to this many megabytes of payload.'),
+            ('progress-interval', '1', 'minimum number of seconds between two progress updates.'),
+            ('output-threads', '0', 'number of threads running sink outputs concurrently. 0 starts one thread per '
+                                    'sink, 1 runs them one after another.'),
+            ('profile-output', None, 'write call counts and latencies of all plugins as json to this file.'),
+            ('cache-directory', None, 'keep the events read from input files in this directory and replay them '
+                                      'on later runs with the same input file and channels.'),
+            ('cache-size-mb', '10240', 'remove least recently used event caches above this size.'),
+            ('flush-interval-s', None, 'in streaming mode, ask the outputs to write what they have every this many '
+                                       'seconds. useful with live inputs.'),
+            ('result-cache-directory', None, 'keep the results of every handler in this directory and only rerun '
+                                             'handlers whose config, plugin source or input file changed.'),
             ('input', 'rsb', 'input metadata provider plugin to load.'),
             ('plugin-path-input', ['./plugins/input'], 'search path for input plugins.'),
             ('plugin-path-handler', ['./plugins/handler'], 'search path for handler plugins.'),
@@ -55,6 +77,9 @@ class Config(object):
         if filename is not None:
             self.__config.read(filename)
 
+    def read_string(self, text):
+        self.__config.readfp(io.BytesIO(text))
+
     def set_if(self, section, option, value):
         if section is not None \
                 and option is not None \
@@ -67,6 +92,15 @@ class Config(object):
     def get(self, section, option):
         return self.__config.get(section, option)
 
+    def get_optional(self, section, option):
+        # unset options may be missing, None or the string 'None'
+        if not self.__config.has_option(section, option):
+            return None
+        value = self.get(section, option)
+        if value is None or value in ('', 'None'):
+            return None
+        return value
+
     def get_eval(self, section, option):
         return ast.literal_eval(self.get(section, option))
 
@@ -102,7 +136,8 @@ class Config(object):
         return self.get_eval('base', 'plugin-path-output')
 
     def options(self, section):
-        result = {}
+        # keeps the order of the config file. outputs are run in this order
+        result = OrderedDict()
         for key, value in self.__config.items(section):
             if value is None:
                 continue
@@ -126,6 +161,29 @@ def default_config():
     add_options_with_comments(config.internal(), 'rsb', [
         ('executable', 'rsbag', 'sets the path to the rsbag application.')
     ])
+    add_options_with_comments(config.internal(), 'rsb-live', [
+        ('scopes', None, 'scopes to listen on. derived from base.channel when not set.'),
+        ('queue-size', '10000', 'maximum number of received events waiting for the handlers.'),
+        ('heartbeat-s', '0.5', 'wake up the reader after this many seconds without events.'),
+        ('duration-s', None, 'stop listening after this many seconds. listens until interrupted when not set.')
+    ])
+    add_options_with_comments(config.internal(), 'tide', [
+        ('payload', 'auto', 'how the tide input reads entries: "notification" for rsb event notifications, "raw" '
+                            'for plain payloads or "auto" to decide by the channel meta data.')
+    ])
+    add_options_with_comments(config.internal(), 'synthetic', [
+        ('events', '10000', 'number of events generated by the synthetic input.'),
+        ('start-time', '1500000000', 'timestamp of the first synthetic event in seconds.'),
+        ('person-channels', '1', 'number of channels with PersonHypotheses events.'),
+        ('person-rate-hz', '30', 'PersonHypotheses events per second and channel.'),
+        ('persons', '3', 'number of persons per PersonHypotheses event.'),
+        ('evidence-channels', '1', 'number of channels with BayesNetworkEvidence events.'),
+        ('evidence-rate-hz', '10', 'BayesNetworkEvidence events per second and channel.'),
+        ('variables', '5', 'number of observed variables per BayesNetworkEvidence event.'),
+        ('states', '3', 'number of states per variable.'),
+        ('change-probability', '0.05', 'probability of a variable changing its state between two events.'),
+        ('seed', '0', 'random seed. equal settings generate equal events.')
+    ])
     add_options_with_comments(config.internal(), 'handler', [
         ('test', "{ 'name': 'test', 'channel': '/test', 'tier': 'testtier' }",
          'handler option-names are ignored. The values must be dicts with at least a "name" defining the handler '
@@ -134,6 +192,6 @@ def default_config():
     add_options_with_comments(config.internal(), 'output', [
         ('elan', "{ 'name': 'generate-elan', 'overwrite-output': 'True' }",
          'output processors are executed on the data generated by all handlers combined. The data is consecutively '
-         'piped through all defined outputs')
+         'piped through all defined outputs that transform it. outputs that only write it run concurrently')
     ])
     return config
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Eaf.py                                             #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from xml.sax.saxutils import escape, quoteattr
+
+__author__ = 'Viktor Richter'
+
+EAF_VERSION = '2.8'
+DEFAULT_LINGUISTIC_TYPE = 'default-lt'
+# annotations are buffered per tier and moved in blocks into one temporary file above this size
+BUFFER_BYTES = 4 * 1024 * 1024
+
+# same constraints as pympi writes into every document
+CONSTRAINTS = [
+    ('Time_Subdivision', "Time subdivision of parent annotation's time interval, no time gaps allowed within this "
+                         "interval"),
+    ('Symbolic_Subdivision', 'Symbolic subdivision of a parent annotation. Annotations refering to the same parent '
+                             'are ordered'),
+    ('Symbolic_Association', '1-1 association with a parent annotation'),
+    ('Included_In', "Time alignable annotations within the parent annotation's time interval, gaps are allowed"),
+]
+
+
+def as_text(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def eaf_date():
+    date = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+    return date[:-2] + ':' + date[-2:]
+
+
+class EafWriter(object):
+    # writes an eaf document without keeping the annotations in memory.
+    # time slots and the annotations of all tiers go to two temporary files which are joined on close.
+    def __init__(self, filename, author='ang'):
+        self.__filename = filename
+        self.__author = author
+        self.__time_slots = tempfile.TemporaryFile()
+        self.__annotations = tempfile.TemporaryFile()
+        self.__buffered = 0
+        # tier -> ((offset, size) of its blocks in the annotations file, annotations not moved there yet)
+        self.__tiers = OrderedDict()
+        self.__last_time_slot = 0
+        self.__last_annotation = 0
+        # pympi documents always contain this tier
+        self.add_tier('default')
+
+    def add_tier(self, tier_name):
+        if tier_name not in self.__tiers:
+            self.__tiers[tier_name] = ([], [])
+
+    def add_annotation(self, tier_name, start, end, value):
+        if tier_name not in self.__tiers:
+            self.add_tier(tier_name)
+        start_slot = self.__add_time_slot(start)
+        end_slot = self.__add_time_slot(end)
+        self.__last_annotation += 1
+        text = (
+            '\t\t<ANNOTATION>\n'
+            '\t\t\t<ALIGNABLE_ANNOTATION ANNOTATION_ID="a{}" TIME_SLOT_REF1="ts{}" TIME_SLOT_REF2="ts{}">\n'
+            '\t\t\t\t<ANNOTATION_VALUE>{}</ANNOTATION_VALUE>\n'
+            '\t\t\t\t</ALIGNABLE_ANNOTATION>\n'
+            '\t\t\t</ANNOTATION>\n'.format(self.__last_annotation, start_slot, end_slot, escape(as_text(value))))
+        self.__tiers[tier_name][1].append(text)
+        self.__buffered += len(text)
+        if self.__buffered >= BUFFER_BYTES:
+            self.__spill()
+
+    def __spill(self):
+        self.__annotations.seek(0, 2)
+        for blocks, pending in self.__tiers.itervalues():
+            if pending:
+                block = ''.join(pending)
+                blocks.append((self.__annotations.tell(), len(block)))
+                self.__annotations.write(block)
+                del pending[:]
+        self.__buffered = 0
+
+    def __add_time_slot(self, value):
+        self.__last_time_slot += 1
+        self.__time_slots.write('\t\t<TIME_SLOT TIME_SLOT_ID="ts{}" TIME_VALUE="{}" />\n'
+                                .format(self.__last_time_slot, int(value)))
+        return self.__last_time_slot
+
+    def write(self, filename=None):
+        # writes the document with everything added so far. can be called repeatedly
+        with open(filename or self.__filename, 'wb') as outfile:
+            outfile.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+            outfile.write('<ANNOTATION_DOCUMENT AUTHOR={} DATE="{}" FORMAT="{}" VERSION="{}" '
+                          'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+                          'xsi:noNamespaceSchemaLocation="http://www.mpi.nl/tools/elan/EAFv{}.xsd">\n'
+                          .format(quoteattr(self.__author), eaf_date(), EAF_VERSION, EAF_VERSION, EAF_VERSION))
+            outfile.write('\t<HEADER>\n'
+                          '\t\t<PROPERTY NAME="lastUsedAnnotation">{}</PROPERTY>\n'
+                          '\t\t</HEADER>\n'.format(self.__last_annotation))
+            outfile.write('\t<TIME_ORDER>\n')
+            self.__copy(self.__time_slots, outfile)
+            outfile.write('\t\t</TIME_ORDER>\n')
+            for tier_name, (blocks, pending) in self.__tiers.iteritems():
+                if not blocks and not pending:
+                    outfile.write('\t<TIER LINGUISTIC_TYPE_REF="{}" TIER_ID={} />\n'
+                                  .format(DEFAULT_LINGUISTIC_TYPE, quoteattr(as_text(tier_name))))
+                    continue
+                outfile.write('\t<TIER LINGUISTIC_TYPE_REF="{}" TIER_ID={}>\n'
+                              .format(DEFAULT_LINGUISTIC_TYPE, quoteattr(as_text(tier_name))))
+                for offset, size in blocks:
+                    self.__copy_block(offset, size, outfile)
+                outfile.writelines(pending)
+                outfile.write('\t\t</TIER>\n')
+            outfile.write('\t<LINGUISTIC_TYPE GRAPHIC_REFERENCES="false" LINGUISTIC_TYPE_ID="{}" '
+                          'TIME_ALIGNABLE="true" />\n'.format(DEFAULT_LINGUISTIC_TYPE))
+            for stereotype, description in CONSTRAINTS:
+                outfile.write('\t<CONSTRAINT DESCRIPTION={} STEREOTYPE="{}" />\n'
+                              .format(quoteattr(description), stereotype))
+            outfile.write('\t</ANNOTATION_DOCUMENT>\n')
+
+    @staticmethod
+    def __copy(source, target):
+        # keeps the write position of source so more entries can be appended afterwards
+        end = source.tell()
+        source.flush()
+        source.seek(0)
+        shutil.copyfileobj(source, target)
+        source.seek(end)
+
+    def __copy_block(self, offset, size, target):
+        self.__annotations.seek(offset)
+        while size > 0:
+            data = self.__annotations.read(min(size, 1024 * 1024))
+            target.write(data)
+            size -= len(data)
+
+    def close(self):
+        self.write()
+        self.__time_slots.close()
+        self.__annotations.close()
+        self.__tiers = OrderedDict()
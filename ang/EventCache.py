@@ -0,0 +1,302 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/EventCache.py                                      #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import json
+import bisect
+import mmap
+import struct
+import hashlib
+import logging
+import datetime
+from rsb import Event, Scope
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+# cache file layout: header, records, json footer, trailer with the footer offset
+HEADER = struct.Struct('<4sH')
+MAGIC = 'ANGC'
+VERSION = 1
+# record: receive time in seconds, channel number, payload size, followed by the payload
+RECORD = struct.Struct('<dII')
+TRAILER = struct.Struct('<Q4s')
+TRAILER_MAGIC = 'ANGE'
+SUFFIX = '.angc'
+# a (time, offset, record number) entry is added to the seek index every INDEX_STEP records
+INDEX_STEP = 1024
+
+
+def event_time(event):
+    return event.getMetaData().userTimes['rsbag:original_receive']
+
+
+def cache_key(config):
+    filename = os.path.abspath(config.input_file())
+    stat = os.stat(filename)
+    input_options = {}
+    if config.internal().has_section(config.input()):
+        input_options = dict(config.internal().items(config.input()))
+    description = [filename, stat.st_size, stat.st_mtime, config.input(), input_options,
+                   sorted(config.get_eval('base', 'channel') or [])]
+    return hashlib.sha1(json.dumps(description, sort_keys=True)).hexdigest()
+
+
+class CacheWriter(object):
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__temporary = '{}.{}.tmp'.format(filename, os.getpid())
+        self.__file = open(self.__temporary, 'wb')
+        self.__file.write(HEADER.pack(MAGIC, VERSION))
+        self.__offset = HEADER.size
+        self.__channels = {}
+        self.__count = 0
+        self.__index = []
+        self.__first = None
+        self.__last = None
+
+    def add(self, time, scope, wire_schema, payload):
+        channel = self.__channels.get((scope, wire_schema))
+        if channel is None:
+            channel = self.__channels[(scope, wire_schema)] = len(self.__channels)
+        if self.__count % INDEX_STEP == 0:
+            self.__index.append((time, self.__offset, self.__count))
+        if self.__first is None:
+            self.__first = time
+        self.__last = time
+        self.__file.write(RECORD.pack(time, channel, len(payload)))
+        self.__file.write(payload)
+        self.__offset += RECORD.size + len(payload)
+        self.__count += 1
+
+    def commit(self):
+        channels = [None] * len(self.__channels)
+        for channel, number in self.__channels.iteritems():
+            channels[number] = channel
+        footer = json.dumps(dict(channels=channels, count=self.__count, index=self.__index,
+                                 first=self.__first, last=self.__last), separators=(',', ':'))
+        self.__file.write(footer)
+        self.__file.write(TRAILER.pack(self.__offset, TRAILER_MAGIC))
+        self.__file.close()
+        os.rename(self.__temporary, self.__filename)
+
+    def abort(self):
+        self.__file.close()
+        os.remove(self.__temporary)
+
+
+class CacheReader(object):
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__file = None
+        self.__map = None
+        # records are only read between open() and close()
+        self.open()
+        try:
+            magic, version = HEADER.unpack_from(self.__map, 0)
+            footer_offset, trailer_magic = TRAILER.unpack_from(self.__map, len(self.__map) - TRAILER.size)
+            if magic != MAGIC or version != VERSION or trailer_magic != TRAILER_MAGIC:
+                raise Exception('{} is not a complete event cache of version {}'.format(filename, VERSION))
+            footer = json.loads(self.__map[footer_offset:len(self.__map) - TRAILER.size])
+        finally:
+            self.close()
+        self.__end = footer_offset
+        self.count = footer['count']
+        self.index = footer['index']
+        self.first = footer['first']
+        self.last = footer['last']
+        self.channels = [(Scope(scope), str(wire_schema)) for scope, wire_schema in footer['channels']]
+
+    def records(self, offset=HEADER.size):
+        # yields (time, channel number, payload buffer) starting at a record offset
+        data = self.__map
+        end = self.__end
+        while offset < end:
+            time, channel, size = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            yield time, channel, buffer(data, offset, size)
+            offset += size
+
+    def events(self, offset=HEADER.size, start=None, end=None):
+        # events with times in [start, end). records before start are not turned into events
+        channels = self.channels
+        for time, channel, payload in self.records(offset):
+            if start is not None and time < start:
+                continue
+            if end is not None and time >= end:
+                return
+            scope, wire_schema = channels[channel]
+            yield Event(scope=scope, data=(wire_schema, payload), userTimes={'rsbag:original_receive': time})
+
+    def seek(self, time):
+        # (offset, record number) of an indexed record at or before the first record at time
+        position = bisect.bisect_left([entry[0] for entry in self.index], time) - 1
+        if position < 0:
+            return HEADER.size, 0
+        return self.index[position][1], self.index[position][2]
+
+    def count_before(self, time):
+        # estimated by the index
+        position = bisect.bisect_left([entry[0] for entry in self.index], time)
+        return self.index[position][2] if position < len(self.index) else self.count
+
+    def open(self):
+        # the footer is only read once
+        if self.__map is None:
+            self.__file = open(self.__filename, 'rb')
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__file.close()
+            self.__map = None
+            self.__file = None
+
+
+def evict(directory, max_bytes, keep):
+    # removes the least recently used cache files until the directory fits into max_bytes
+    entries = []
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if name.endswith(SUFFIX) and path != keep:
+            stat = os.stat(path)
+            entries.append((stat.st_atime, stat.st_size, path))
+    total = sum(entry[1] for entry in entries)
+    if os.path.exists(keep):
+        total += os.path.getsize(keep)
+    for atime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        logger.info('evicting event cache {}'.format(path))
+        os.remove(path)
+        total -= size
+
+
+class CachedInput(object):
+    # replays events from the cache file or records them while reading from the wrapped input.
+    # the wrapped input is only created when the cache misses.
+    def __init__(self, create_input, config):
+        self.__create_input = create_input
+        self.__input = None
+        self.__directory = config.get_optional('base', 'cache-directory')
+        self.__max_bytes = float(config.get('base', 'cache-size-mb')) * 1024 * 1024
+        if not os.path.isdir(self.__directory):
+            os.makedirs(self.__directory)
+        self.__filename = os.path.join(self.__directory, cache_key(config) + SUFFIX)
+        self.__reader = None
+        self.__range = (None, None)
+        if os.path.exists(self.__filename):
+            try:
+                self.__reader = CacheReader(self.__filename)
+                os.utime(self.__filename, None)
+                logger.info('replaying events from cache {}'.format(self.__filename))
+            except Exception as e:
+                logger.warning('ignoring broken event cache {}: {}'.format(self.__filename, e))
+        if self.__reader is None:
+            self.__input = self.__create_input()
+
+    def __record(self, events):
+        writer = CacheWriter(self.__filename)
+        complete = False
+        try:
+            for event in events:
+                scope, wire_schema = self.__input.channel(event)
+                writer.add(event_time(event), scope, wire_schema, event.getData()[1])
+                yield event
+            complete = True
+        finally:
+            if complete:
+                writer.commit()
+                logger.info('stored events in cache {}'.format(self.__filename))
+                evict(self.__directory, self.__max_bytes, self.__filename)
+            else:
+                # partially read recordings are not cached
+                writer.abort()
+
+    def set_time_range(self, start, end):
+        if self.__reader is not None:
+            self.__range = (None if start is None else start.total_seconds(),
+                            None if end is None else end.total_seconds())
+        elif hasattr(self.__input, 'set_time_range'):
+            # only complete recordings are cached
+            logger.info('not caching events of a time range')
+            self.__range = (start, end)
+            self.__input.set_time_range(start, end)
+
+    def estimated_count(self):
+        start, end = self.__range
+        if self.__reader is not None:
+            first = self.__reader.seek(start)[1] if start is not None else 0
+            last = self.__reader.count_before(end) if end is not None else self.__reader.count
+            return last - first
+        if hasattr(self.__input, 'estimated_count'):
+            return self.__input.estimated_count()
+        return None
+
+    def events(self):
+        start, end = self.__range
+        if self.__reader is not None:
+            if start is None and end is None:
+                return self.__reader.events()
+            offset = self.__reader.seek(start)[0] if start is not None else HEADER.size
+            return self.__reader.events(offset, start, end)
+        events = self.__input.events()
+        if start is not None or end is not None:
+            return events
+        return self.__record(events)
+
+    def channel(self, event):
+        return (event.scope.toString(), event.getData()[0])
+
+    def event_size(self, event):
+        return len(event.getData()[1])
+
+    def time_range(self):
+        if self.__reader is not None:
+            if self.__reader.count == 0:
+                return None
+            return (datetime.timedelta(seconds=self.__reader.first), datetime.timedelta(seconds=self.__reader.last))
+        if hasattr(self.__input, 'time_range'):
+            return self.__input.time_range()
+        return None
+
+    def __enter__(self):
+        if self.__reader is not None:
+            self.__reader.open()
+        if self.__input is not None:
+            self.__input.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.__reader is not None:
+            self.__reader.close()
+        if self.__input is not None:
+            self.__input.__exit__(exc_type, exc_val, exc_tb)
+
+    def set_profiler(self, profiler, name):
+        if self.__input is not None and hasattr(self.__input, 'set_profiler'):
+            self.__input.set_profiler(profiler, name)
+
+    def validate_setup(self):
+        if self.__input is not None:
+            self.__input.validate_setup()
@@ -19,39 +19,103 @@
 #                                                                 #
 ###################################################################
 
+import re
 import logging
 
 __author__ = 'Viktor Richter'
 
+# user patterns referring to groups by number can not be embedded into the combined pattern
+BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+# python 2 applies inline flags to the whole pattern, i.e. to all other handles in the combined pattern
+INLINE_FLAGS = re.compile(r'\(\?[iLmsux]')
+LITERAL = re.compile(r'^[\w/:\- ]*$')
+
+
+def handle_group(index):
+    return 'h{}'.format(index)
+
+
+class DispatchIndex(object):
+    def __init__(self, handles):
+        self.__handles = list(handles)
+        self.__literals = []
+        self.__separate = []
+        patterns = []
+        combined = []
+        for index, handle in enumerate(self.__handles):
+            channel = handle.channel()
+            if LITERAL.match(channel):
+                self.__literals.append((index, channel))
+            elif BACKREFERENCE.search(channel) or INLINE_FLAGS.search(channel):
+                self.__separate.append(index)
+            else:
+                # every handle gets an optional lookahead. the named groups tell which ones matched.
+                patterns.append('(?=(?:.*?(?P<{}>{}))?)'.format(handle_group(index), channel))
+                combined.append(index)
+        self.__combined = None
+        # user patterns may have named groups too
+        self.__groups = [(handle_group(index), index) for index in combined]
+        if patterns:
+            try:
+                self.__combined = re.compile(''.join(patterns))
+            except re.error as error:
+                logging.debug('cannot combine handle channels, matching them one by one: {}'.format(error))
+                self.__separate.extend(combined)
+
+    def match(self, channel):
+        matches = set(index for index, literal in self.__literals if literal in channel)
+        if self.__combined is not None:
+            match = self.__combined.match(channel)
+            matches.update(index for group, index in self.__groups if match.group(group) is not None)
+        matches.update(index for index in self.__separate if self.__handles[index].match(channel))
+        # keep the order in which the handles were added
+        return tuple(self.__handles[index] for index in sorted(matches))
+
 
 class HandlerRepository(object):
-    def __init__(self):
+    def __init__(self, cache_size=100000):
         self.__cache = {}
+        self.__cache_size = cache_size
         self.__handles = []
+        self.__index = None
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
 
     def add_handle(self, handle):
         logging.debug('adding handle address "{}" name "{}" channel "{}" '.format(handle, handle.name(), handle.channel()))
         self.__handles.append(handle)
+        self.__index = None
         self.__cache = {}
 
     def match_handle(self, channel):
-        result = []
-        for handle in self.__handles:
-            if handle.match(channel):
-                result.append(handle)
+        # channel may be a (scope, type) tuple as returned by the input or a 'scope:type' string
+        channel_string = ':'.join(channel) if isinstance(channel, tuple) else channel
+        if self.__index is None:
+            self.__index = DispatchIndex(self.__handles)
+        result = self.__index.match(channel_string)
+        if len(self.__cache) >= self.__cache_size:
+            self.__cache = {}
+            self.__evictions += 1
         self.__cache[channel] = result
-        logging.debug('handles matching channel "{}" found: {} '.format(channel, result))
+        logging.debug('handles matching channel "{}" found: {} '.format(channel_string, result))
         return result
 
     def get_handle(self, channel):
         # lookup in handler cache
         result = self.__cache.get(channel)
         if result is not None:
+            self.__hits += 1
             return result
         else:
             # initial lookup should happen once per channel
+            self.__misses += 1
             return self.match_handle(channel)
 
     def get_all_handles(self):
         return self.__handles
 
+    def statistics(self):
+        return dict(hits=self.__hits, misses=self.__misses, evictions=self.__evictions,
+                    channels=len(self.__cache), handles=len(self.__handles))
+
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Ndjson.py                                          #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import gzip
+import json
+
+__author__ = 'Viktor Richter'
+
+GZIP_MAGIC = '\x1f\x8b'
+
+
+def is_compressed(filename):
+    with open(filename, 'rb') as infile:
+        return infile.read(2) == GZIP_MAGIC
+
+
+def dumps(data):
+    return json.dumps(data, sort_keys=True, separators=(',', ':'))
+
+
+class NdjsonWriter(object):
+    # writes one compact json object per line
+    def __init__(self, filename, compress=False):
+        self.__file = gzip.open(filename, 'wb') if compress else open(filename, 'wb')
+        self.__written = 0
+
+    def write(self, data):
+        self.__file.write(dumps(data))
+        self.__file.write('\n')
+        self.__written += 1
+
+    def flush(self):
+        self.__file.flush()
+
+    def written(self):
+        return self.__written
+
+    def close(self):
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def read(filename):
+    # yields the objects of a (possibly gzip compressed) ndjson file one by one
+    infile = gzip.open(filename, 'rb') if is_compressed(filename) else open(filename, 'rb')
+    with infile:
+        for line in infile:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Prefetch.py                                        #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import sys
+import logging
+import threading
+from collections import deque
+from timeit import default_timer as clock
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+END = object()
+
+
+class PrefetchedEvents(object):
+    # reads events on a background thread into a queue bounded by depth events and/or max_bytes payload bytes.
+    # starved counts the reads that had to wait for the input, blocked the inputs that had to wait for room.
+    def __init__(self, events, depth=None, max_bytes=None, event_size=None):
+        self.__events = events
+        self.__depth = depth or None
+        self.__max_bytes = max_bytes if event_size is not None else None
+        self.__event_size = event_size
+        self.__iteration = None
+        self.__statistics = dict(events=0, starved=0, starved_seconds=0., blocked=0, blocked_seconds=0.,
+                                 max_queued=0)
+
+    def statistics(self):
+        return dict(self.__statistics)
+
+    def __iter__(self):
+        self.__iteration = self.__iterate()
+        return self.__iteration
+
+    # stops the reader thread of the current iteration
+    def close(self):
+        if self.__iteration is not None:
+            self.__iteration.close()
+
+    def __iterate(self):
+        queue = deque()
+        condition = threading.Condition()
+        state = dict(bytes=0, stop=False, error=None)
+        statistics = self.__statistics
+
+        def full(size):
+            if self.__depth is not None and len(queue) >= self.__depth:
+                return True
+            # a single event larger than max_bytes still passes when the queue is empty
+            return self.__max_bytes is not None and len(queue) > 0 and state['bytes'] + size > self.__max_bytes
+
+        def read():
+            try:
+                for event in self.__events:
+                    size = self.__event_size(event) if self.__event_size and event is not None else 0
+                    with condition:
+                        if full(size) and not state['stop']:
+                            statistics['blocked'] += 1
+                            start = clock()
+                            while full(size) and not state['stop']:
+                                condition.wait()
+                            statistics['blocked_seconds'] += clock() - start
+                        if state['stop']:
+                            return
+                        queue.append((event, size))
+                        state['bytes'] += size
+                        statistics['max_queued'] = max(statistics['max_queued'], len(queue))
+                        condition.notify()
+            except:
+                state['error'] = sys.exc_info()
+            finally:
+                with condition:
+                    queue.append((END, 0))
+                    condition.notify()
+
+        reader = threading.Thread(target=read, name='prefetch')
+        reader.daemon = True
+        reader.start()
+        try:
+            while True:
+                with condition:
+                    if not queue:
+                        statistics['starved'] += 1
+                        start = clock()
+                        while not queue:
+                            condition.wait()
+                        statistics['starved_seconds'] += clock() - start
+                    event, size = queue.popleft()
+                    state['bytes'] -= size
+                    condition.notify()
+                if event is END:
+                    if state['error'] is not None:
+                        raise state['error'][0], state['error'][1], state['error'][2]
+                    return
+                statistics['events'] += 1
+                yield event
+        finally:
+            # also reached when the reader of the events stops early
+            with condition:
+                state['stop'] = True
+                condition.notify()
+            reader.join()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Profiling.py                                       #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import json
+import random
+import threading
+from timeit import default_timer as clock
+
+__author__ = 'Viktor Richter'
+
+
+def percentile(ordered, fraction):
+    if len(ordered) == 0:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Timing(object):
+    def __init__(self, max_samples):
+        self.count = 0
+        self.total = 0.
+        self.maximum = 0.
+        # reservoir of durations for percentile estimation
+        self.samples = []
+        self.__max_samples = max_samples
+
+    def add(self, seconds, rng):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.maximum:
+            self.maximum = seconds
+        if len(self.samples) < self.__max_samples:
+            self.samples.append(seconds)
+        else:
+            index = rng.randint(0, self.count - 1)
+            if index < self.__max_samples:
+                self.samples[index] = seconds
+
+    def merge(self, other, rng):
+        self.count += other.count
+        self.total += other.total
+        self.maximum = max(self.maximum, other.maximum)
+        samples = self.samples + other.samples
+        if len(samples) > self.__max_samples:
+            samples = rng.sample(samples, self.__max_samples)
+        self.samples = samples
+
+    def summary(self):
+        ordered = sorted(self.samples)
+        return dict(count=self.count,
+                    total_s=self.total,
+                    mean_s=self.total / self.count if self.count > 0 else None,
+                    p50_s=percentile(ordered, .5),
+                    p90_s=percentile(ordered, .9),
+                    p99_s=percentile(ordered, .99),
+                    max_s=self.maximum)
+
+
+class Profiler(object):
+    def __init__(self, max_samples=10000):
+        self.__timings = {}
+        self.__max_samples = max_samples
+        self.__random = random.Random(0)
+        # handlers may record from their worker threads
+        self.__lock = threading.Lock()
+        self.__start = clock()
+
+    def record(self, kind, name, operation, seconds, channel=None):
+        key = (kind, name, operation, channel)
+        with self.__lock:
+            timing = self.__timings.get(key)
+            if timing is None:
+                timing = self.__timings[key] = Timing(self.__max_samples)
+            timing.add(seconds, self.__random)
+
+    def timed(self, iterable, kind, name, operation):
+        # yields the items of iterable and records the time spent waiting for each one
+        iterator = iter(iterable)
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(kind, name, operation, clock() - start)
+            yield item
+
+    def merge(self, other):
+        with self.__lock:
+            for key, timing in other.timings().iteritems():
+                if key in self.__timings:
+                    self.__timings[key].merge(timing, self.__random)
+                else:
+                    self.__timings[key] = timing
+
+    def timings(self):
+        return self.__timings
+
+    def report(self, **extra):
+        entries = []
+        for (kind, name, operation, channel), timing in sorted(self.__timings.iteritems()):
+            entry = dict(kind=kind, name=name, operation=operation, channel=channel)
+            entry.update(timing.summary())
+            entries.append(entry)
+        report = dict(wall_time_s=clock() - self.__start, timings=entries)
+        report.update(extra)
+        return report
+
+    def dump(self, filename, **extra):
+        with open(filename, 'w') as outfile:
+            json.dump(self.report(**extra), outfile, sort_keys=True, indent=4, separators=(',', ': '))
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_Profiler__lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
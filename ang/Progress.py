@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Progress.py                                        #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import sys
+import time
+import datetime
+
+__author__ = 'Viktor Richter'
+
+# the clock is only read every CHECK_EVERY events
+CHECK_EVERY = 256
+
+
+class Progress(object):
+    def __init__(self, total_events=None):
+        self.phase = 'reading'
+        self.events_read = 0
+        self.bytes_read = 0
+        # (scope, type) -> number of handler calls
+        self.events_dispatched = {}
+        self.total_events = total_events
+        self.start_time = time.time()
+
+    def elapsed(self):
+        return time.time() - self.start_time
+
+    def events_per_second(self):
+        elapsed = self.elapsed()
+        if elapsed <= 0:
+            return 0.
+        return self.events_read / elapsed
+
+    def fraction(self):
+        if not self.total_events:
+            return None
+        return min(1., float(self.events_read) / self.total_events)
+
+    def eta(self):
+        rate = self.events_per_second()
+        if self.total_events is None or rate <= 0:
+            return None
+        return datetime.timedelta(seconds=int(max(0, self.total_events - self.events_read) / rate))
+
+
+def progress_pass(progress):
+    pass
+
+
+class TerminalRenderer(object):
+    def __init__(self, stream=sys.stdout):
+        self.__stream = stream
+        self.__phase = None
+
+    def __call__(self, progress):
+        if self.__phase is not None and self.__phase != progress.phase:
+            self.__stream.write('\n')
+        self.__phase = progress.phase
+        line = '>> {}: {} events'.format(progress.phase, progress.events_read)
+        if progress.total_events:
+            line += ' of {} ({:.1f}%)'.format(progress.total_events, progress.fraction() * 100)
+        if progress.phase == 'reading':
+            line += ', {:.0f} events/s, {:.1f} MB'.format(progress.events_per_second(), progress.bytes_read / 1048576.)
+            eta = progress.eta()
+            if eta is not None:
+                line += ', eta {}'.format(eta)
+        self.__stream.write('\r' + line.ljust(79))
+        self.__stream.flush()
+
+    def close(self):
+        if self.__phase is not None:
+            self.__stream.write('\n')
+            self.__phase = None
+
+
+class ProgressReporter(object):
+    def __init__(self, callback=progress_pass, interval=1., total_events=None):
+        self.progress = Progress(total_events)
+        self.__callback = callback
+        self.__interval = interval
+        self.__last_report = 0.
+        # never look at the clock when nobody listens
+        self.__next_check = CHECK_EVERY if callback is not progress_pass else float('inf')
+
+    def event(self, channel, dispatched, size=0):
+        progress = self.progress
+        progress.events_read += 1
+        progress.bytes_read += size
+        if dispatched:
+            progress.events_dispatched[channel] = progress.events_dispatched.get(channel, 0) + dispatched
+        if progress.events_read >= self.__next_check:
+            self.__next_check = progress.events_read + CHECK_EVERY
+            now = time.time()
+            if now - self.__last_report >= self.__interval:
+                self.__last_report = now
+                self.__callback(progress)
+
+    def phase(self, phase):
+        self.progress.phase = phase
+        self.report()
+
+    def report(self):
+        self.__last_report = time.time()
+        self.__callback(self.progress)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/ResultCache.py                                     #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import json
+import inspect
+import hashlib
+import logging
+import cPickle as pickle
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = '.angr'
+
+
+def source_digest(plugin):
+    # sources of the handler class and its base classes
+    digest = hashlib.sha1()
+    for cls in type(plugin).__mro__:
+        if cls is object:
+            continue
+        try:
+            filename = inspect.getsourcefile(cls) or inspect.getfile(cls)
+        except TypeError:
+            continue
+        with open(filename, 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()
+
+
+def handler_fingerprint(config, configured_channels, handle):
+    # everything the unfinished data of a handler depends on. start-time-ms is applied afterwards.
+    # configured_channels is the channel option before the handler channels were added.
+    description = [config.input(), handle.key(), handle.config(), source_digest(handle.plugin()),
+                   configured_channels, config.get('base', 'number-events')]
+    window = config.get_optional('base', 'start-time'), config.get_optional('base', 'end-time')
+    if window != (None, None):
+        # the window is relative to start-time-ms
+        description.append([config.get('base', 'start-time-ms'), window])
+    if config.get_optional('base', 'number-events') is not None:
+        # the event limit counts the events of all channels
+        description.append(sorted(config.get_eval('base', 'channel') or []))
+    if config.internal().has_section(config.input()):
+        description.append(dict(config.internal().items(config.input())))
+    input_file = config.get_optional('base', 'input-file')
+    if input_file is not None and os.path.exists(input_file):
+        stat = os.stat(input_file)
+        description += [os.path.abspath(input_file), stat.st_size, stat.st_mtime]
+    return hashlib.sha1(json.dumps(description, sort_keys=True, default=repr)).hexdigest()
+
+
+class ResultCache(object):
+    # keeps the unfinished tiers of each handler together with the time of the last event
+    def __init__(self, directory):
+        self.__directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def filename(self, fingerprint):
+        return os.path.join(self.__directory, fingerprint + SUFFIX)
+
+    def contains(self, fingerprint):
+        return os.path.exists(self.filename(fingerprint))
+
+    def load(self, fingerprint):
+        try:
+            with open(self.filename(fingerprint), 'rb') as infile:
+                return pickle.load(infile)
+        except Exception as e:
+            logger.warning('could not read cached handler result {}: {}'.format(fingerprint, e))
+            return None
+
+    def discard(self, fingerprint):
+        try:
+            os.remove(self.filename(fingerprint))
+        except OSError as e:
+            logger.warning('could not remove cached handler result {}: {}'.format(fingerprint, e))
+
+    def store(self, fingerprint, data, last_event_time):
+        filename = self.filename(fingerprint)
+        partial = '{}.{}.part'.format(filename, os.getpid())
+        with open(partial, 'wb') as outfile:
+            pickle.dump((data, last_event_time), outfile, pickle.HIGHEST_PROTOCOL)
+        os.rename(partial, filename)
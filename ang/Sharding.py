@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Sharding.py                                        #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+__author__ = 'Viktor Richter'
+
+
+def split_time_range(first, last, shards):
+    # returns consecutive (start, end) windows. the last window has no end and includes the last event.
+    step = (last - first) / shards
+    windows = []
+    for shard in range(shards):
+        start = None if shard == 0 else first + step * shard
+        end = None if shard == shards - 1 else first + step * (shard + 1)
+        windows.append((start, end))
+    return windows
+
+
+def stitch_tiers(head, tail, combine_repeated=True, override_last_end=True):
+    # appends the entries of the following time window to head as if they were added one after another.
+    # the first entry of a window is the only one that has not seen its predecessor, replaying the rest
+    # keeps their already chained end times.
+    for tier_name, entries in tail.iteritems():
+        tier = head.get(tier_name)
+        if not tier:
+            head[tier_name] = entries
+            continue
+        for index in xrange(len(entries)):
+            if override_last_end:
+                tier.set_end(-1, entries.start_ns(index))
+            if (not combine_repeated) or (tier.label(-1) != entries.label(index)):
+                tier.append_from(entries, index)
+    return head
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Tier.py                                            #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import datetime
+from array import array
+
+__author__ = 'Viktor Richter'
+
+# python 2 has no 'q' typecode but 'l' is 64 bit on the supported platforms
+try:
+    INT64 = array('q').typecode
+except ValueError:
+    INT64 = 'l'
+    assert array(INT64).itemsize == 8, 'no 64 bit integer array type available'
+
+# end time of entries which are not closed yet
+OPEN = -2 ** 63
+
+
+def to_nanoseconds(time):
+    if isinstance(time, datetime.timedelta):
+        return ((time.days * 86400 + time.seconds) * 10 ** 6 + time.microseconds) * 1000
+    # plain numbers are seconds
+    return int(round(time * 1e9))
+
+
+def to_timedelta(nanoseconds):
+    return datetime.timedelta(microseconds=nanoseconds // 1000)
+
+
+def label_key(label):
+    # only hashable labels are interned. (type, label) keeps e.g. 1, 1.0 and True apart
+    try:
+        hash(label)
+    except TypeError:
+        return None
+    return type(label), label
+
+
+class Tier(object):
+    # annotations of one tier as start/end arrays in nanoseconds plus an interned label table.
+    # iterating or indexing returns dict(start, end, label) copies for code working on lists of dicts.
+    def __init__(self):
+        self.__starts = array(INT64)
+        self.__ends = array(INT64)
+        self.__label_ids = array(INT64)
+        self.__labels = []
+        self.__interned = {}
+        # added to all times when reading. makes shifting a whole tier O(1)
+        self.__offset = 0
+
+    @staticmethod
+    def from_columns(starts, ends, label_ids, labels):
+        # starts, ends and label ids as strings of native 64 bit integers, e.g. from numpy's tostring()
+        tier = Tier()
+        tier.__starts.fromstring(starts)
+        tier.__ends.fromstring(ends)
+        tier.__label_ids.fromstring(label_ids)
+        if not len(tier.__starts) == len(tier.__ends) == len(tier.__label_ids):
+            raise Exception('tier columns differ in length')
+        tier.__labels = list(labels)
+        for label_id, label in enumerate(tier.__labels):
+            key = label_key(label)
+            if key is not None:
+                tier.__interned.setdefault(key, label_id)
+        return tier
+
+    def columns(self):
+        # (starts, ends, label ids, offset) without copying. the arrays must not be changed.
+        # the offset has to be added to all times except OPEN ends
+        return self.__starts, self.__ends, self.__label_ids, self.__offset
+
+    @staticmethod
+    def from_entries(entries):
+        tier = Tier()
+        for entry in entries:
+            end = to_nanoseconds(entry['end']) if entry.get('end') is not None else OPEN
+            tier.append(to_nanoseconds(entry['start']), entry['label'], end)
+        return tier
+
+    def __len__(self):
+        return len(self.__starts)
+
+    def __nonzero__(self):
+        return len(self.__starts) > 0
+
+    def __iter__(self):
+        for index in xrange(len(self.__starts)):
+            yield self[index]
+
+    def __getitem__(self, index):
+        entry = dict(start=to_timedelta(self.start_ns(index)), label=self.label(index))
+        if self.has_end(index):
+            entry['end'] = to_timedelta(self.end_ns(index))
+        return entry
+
+    def intern(self, label, key=None):
+        if key is None:
+            key = label_key(label)
+        if key is not None:
+            label_id = self.__interned.get(key)
+            if label_id is not None:
+                return label_id
+            self.__interned[key] = len(self.__labels)
+        self.__labels.append(label)
+        return len(self.__labels) - 1
+
+    def append(self, start, label, end=OPEN, key=None):
+        self.append_id(start, self.intern(label, key), end)
+
+    def append_id(self, start, label_id, end=OPEN):
+        self.__starts.append(start - self.__offset)
+        self.__ends.append(end - self.__offset if end != OPEN else OPEN)
+        self.__label_ids.append(label_id)
+
+    def append_from(self, other, index):
+        self.append(other.start_ns(index), other.label(index), other.end_ns(index))
+
+    def extend(self, other):
+        if not isinstance(other, Tier):
+            other = Tier.from_entries(other)
+        for index in xrange(len(other)):
+            self.append_from(other, index)
+
+    def pop(self):
+        entry = self[-1]
+        self.__starts.pop()
+        self.__ends.pop()
+        self.__label_ids.pop()
+        if len(self.__starts) == 0:
+            # nothing refers to the labels anymore
+            self.__labels = []
+            self.__interned = {}
+        return entry
+
+    def start_ns(self, index):
+        return self.__starts[index] + self.__offset
+
+    def end_ns(self, index):
+        end = self.__ends[index]
+        return end + self.__offset if end != OPEN else OPEN
+
+    def has_end(self, index):
+        return self.__ends[index] != OPEN
+
+    def set_end(self, index, end):
+        self.__ends[index] = end - self.__offset if end != OPEN else OPEN
+
+    def label(self, index):
+        return self.__labels[self.__label_ids[index]]
+
+    def label_id(self, index):
+        return self.__label_ids[index]
+
+    def labels(self):
+        return self.__labels
+
+    def offset(self, nanoseconds):
+        self.__offset += nanoseconds
+
+    def iter_ns(self):
+        # yields (start, end, label) in nanoseconds. end is None for entries that were not closed
+        offset = self.__offset
+        labels = self.__labels
+        for start, end, label_id in zip(self.__starts, self.__ends, self.__label_ids):
+            yield start + offset, (end + offset if end != OPEN else None), labels[label_id]
+
+    def iter_ms(self):
+        # same as iter_ns in milliseconds. rounds down like the outputs did for timedeltas
+        for start, end, label in self.iter_ns():
+            yield start // 1000000, (end // 1000000 if end is not None else None), label
+
+
+def as_tiers(data):
+    # handlers may still return lists of dicts
+    tiers = {}
+    for tier_name, values in (data or {}).iteritems():
+        tiers[tier_name] = values if isinstance(values, Tier) else Tier.from_entries(values)
+    return tiers
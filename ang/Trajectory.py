@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : ang/Trajectory.py                                      #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import sys
+import json
+import struct
+from array import array
+from ang.Tier import INT64
+
+__author__ = 'Viktor Richter'
+
+# trajectory file layout: header, the frame id table as json, then every track as a track header followed by
+# its time, x, y, z and frame columns in little endian
+HEADER = struct.Struct('<4sHI')
+MAGIC = 'ANGT'
+VERSION = 1
+# tracking id, number of samples
+TRACK = struct.Struct('<qI')
+
+
+class Track(object):
+    # samples of one tracking id. times in nanoseconds, frames index the frame id table of the store
+    def __init__(self):
+        self.times = array(INT64)
+        self.x = array('d')
+        self.y = array('d')
+        self.z = array('d')
+        self.frames = array('I')
+
+    def __len__(self):
+        return len(self.times)
+
+    def columns(self):
+        return self.times, self.x, self.y, self.z, self.frames
+
+
+class TrajectoryStore(object):
+    def __init__(self):
+        self.__tracks = {}
+        self.__frames = []
+        self.__interned = {}
+
+    def add(self, id, time, x, y, z, frame_id):
+        track = self.__tracks.get(id)
+        if track is None:
+            track = self.__tracks[id] = Track()
+        frame = self.__interned.get(frame_id)
+        if frame is None:
+            frame = self.__interned[frame_id] = len(self.__frames)
+            self.__frames.append(frame_id)
+        track.times.append(time)
+        track.x.append(x)
+        track.y.append(y)
+        track.z.append(z)
+        track.frames.append(frame)
+
+    def tracks(self):
+        return self.__tracks
+
+    def frames(self):
+        return self.__frames
+
+    def samples(self):
+        return sum(len(track) for track in self.__tracks.itervalues())
+
+    def write(self, filename):
+        frames = json.dumps(self.__frames)
+        partial = '{}.{}.part'.format(filename, os.getpid())
+        with open(partial, 'wb') as outfile:
+            outfile.write(HEADER.pack(MAGIC, VERSION, len(frames)))
+            outfile.write(frames)
+            for id in sorted(self.__tracks):
+                track = self.__tracks[id]
+                outfile.write(TRACK.pack(id, len(track)))
+                for column in track.columns():
+                    little_endian(column).tofile(outfile)
+        os.rename(partial, filename)
+
+
+def little_endian(column):
+    if sys.byteorder == 'little':
+        return column
+    column = array(column.typecode, column)
+    column.byteswap()
+    return column
+
+
+def read(filename):
+    # returns (frame id table, {tracking id: Track})
+    tracks = {}
+    with open(filename, 'rb') as infile:
+        magic, version, frames_size = HEADER.unpack(infile.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise Exception('{} is not a trajectory file of version {}'.format(filename, VERSION))
+        frames = json.loads(infile.read(frames_size))
+        while True:
+            header = infile.read(TRACK.size)
+            if len(header) == 0:
+                break
+            id, count = TRACK.unpack(header)
+            track = tracks[id] = Track()
+            for column in track.columns():
+                column.fromfile(infile, count)
+                if sys.byteorder != 'little':
+                    column.byteswap()
+    return frames, tracks
@@ -20,7 +20,10 @@
 
 import logging
 from datetime import timedelta
+from timeit import default_timer as clock
 from rsb import Event
+from ang.Sharding import stitch_tiers
+from ang.Tier import Tier, to_nanoseconds, OPEN
 
 __author__ = 'Viktor Richter'
 
@@ -30,27 +33,80 @@ logger = logging.getLogger(__name__)
 class BaseHandler(object):
     def __init__(self):
         self.__data = {}
+        self.__sink = None
+        # fingerprints of the last state per tier for add_state
+        self.__fingerprints = {}
+        self.__statistics = dict(states=0, collapsed=0, labels_built=0)
+
+    def set_sink(self, sink):
+        # when a sink is set, closed entries are passed on instead of being kept until finish()
+        self.__sink = sink
 
     def add_entry(self, tier_name, entry, combine_repeated=True, override_last_end=True):
-        if tier_name not in self.__data:
-            self.__data[tier_name] = [entry]
+        start = to_nanoseconds(entry['start'])
+        end = to_nanoseconds(entry['end']) if entry.get('end') is not None else OPEN
+        tier = self.__data.get(tier_name)
+        if tier is None:
+            tier = self.__data[tier_name] = Tier()
+            tier.append(start, entry['label'], end)
+            return
+        if override_last_end:
+            tier.set_end(-1, start)
+        if (not combine_repeated) or (tier.label(-1) != entry['label']):
+            if self.__sink is not None:
+                # the previous entry can not change anymore
+                self.__sink(tier_name, tier.pop())
+            tier.append(start, entry['label'], end)
         else:
-            tier_data = self.__data[tier_name]
+            self.__statistics['collapsed'] += 1
+
+    def add_state(self, tier_name, start, fingerprint, build_label, override_last_end=True):
+        # same as add_entry with combine_repeated=True for labels that are expensive to build or compare.
+        # fingerprint must be equal exactly when the labels are equal. build_label() is only called on changes.
+        self.__statistics['states'] += 1
+        if tier_name in self.__fingerprints and self.__fingerprints[tier_name] == fingerprint:
             if override_last_end:
-                tier_data[-1]['end'] = entry['start']
-            if (not combine_repeated) or (tier_data[-1]['label'] != entry['label']):
-                tier_data.append(entry)
+                self.__data[tier_name].set_end(-1, to_nanoseconds(start))
+            self.__statistics['collapsed'] += 1
+            return
+        self.__fingerprints[tier_name] = fingerprint
+        self.__statistics['labels_built'] += 1
+        self.add_entry(tier_name, dict(start=start, label=build_label()), override_last_end=override_last_end)
 
     def entries(self):
         return self.__data
 
+    def statistics(self):
+        return dict(self.__statistics)
+
+    def stitch(self, head, tail):
+        # joins the entries of two consecutive time windows. must match the add_entry arguments used by the handler
+        return stitch_tiers(head, tail)
+
 
 class Deserializer(object):
     def __init__(self, typeobject):
         self.__typename = '.'+typeobject.DESCRIPTOR.full_name
         self.__typeobject = typeobject
+        self.__profiler = None
+        self.__profile_name = None
+
+    def set_profiler(self, profiler, name):
+        self.__profiler = profiler
+        self.__profile_name = name
+
+    def message_type(self):
+        return self.__typeobject
 
     def deserialize(self, event):
+        if self.__profiler is None:
+            return self.__deserialize(event)
+        start = clock()
+        data = self.__deserialize(event)
+        self.__profiler.record('handler', self.__profile_name, 'deserialize', clock() - start, self.__typename)
+        return data
+
+    def __deserialize(self, event):
         data_type, data_bytearray = event.getData()
         if data_type != self.__typename:
             Exception(__name__ + ' works ' + self.__typename + '. Got ', data_type)
@@ -63,8 +119,23 @@ class RstBaseHandler(BaseHandler):
     def __init__(self, typeobject):
         BaseHandler.__init__(self)
         self.__deserializer = Deserializer(typeobject=typeobject)
+        self.__decoded = None
+
+    def set_profiler(self, profiler, name):
+        self.__deserializer.set_profiler(profiler, name)
+
+    def message_type(self):
+        return self.__deserializer.message_type()
+
+    def set_decoded(self, event, decoded):
+        # (message, time) of the event, decoded once for all handlers of its type. read_event returns it
+        self.__decoded = (event, decoded)
 
     def read_event(self, event):
+        decoded = self.__decoded
+        if decoded is not None and decoded[0] is event:
+            self.__decoded = None
+            return decoded[1]
         if not isinstance(event, Event):
             Exception(__name__ + ' works on rsb.Events. Got ', type(event))
         return self.__deserializer.deserialize(event), \
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : annotation-benchmark.py                                #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import argparse
+import logging
+import sys
+from ang.Benchmark import STAGES, run_benchmark, store_results, load_results, compare_results
+
+__author__ = 'Viktor Richter'
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description='Measure throughput and peak memory with synthetic events.')
+    parser.add_argument('-s', '--stage', type=str, choices=STAGES, action='append', default=None,
+                        help='Stage to measure. Can be given multiple times. Defaults to all stages.')
+    parser.add_argument('-p', '--parameter', type=str, metavar=('OPTION', 'VALUE'), nargs=2, action='append',
+                        default=[], help='Override an option of the synthetic input, e.g. "events" "100000".')
+    parser.add_argument('-r', '--repeat', type=int, default=1, help='Repetitions per stage. The best run is kept.')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Store results as json in this file.')
+    parser.add_argument('-b', '--baseline', type=str, default=None, help='Compare with results stored earlier.')
+    parser.add_argument('-t', '--tolerance', type=float, default=0.1,
+                        help='Relative slowdown or memory growth reported as regression.')
+    args = parser.parse_args(arguments)
+
+    results = run_benchmark(dict(args.parameter), args.stage or STAGES, args.repeat)
+    if args.output is not None:
+        store_results(results, args.output)
+    if args.baseline is None:
+        return 0
+    regressions = 0
+    for stage, speed, memory, regression in compare_results(load_results(args.baseline), results, args.tolerance):
+        logging.info('{}: throughput x{}, peak memory x{}{}'.format(
+            stage,
+            '{:.2f}'.format(speed) if speed is not None else '?',
+            '{:.2f}'.format(memory) if memory is not None else '?',
+            ' REGRESSION' if regression else ''))
+        regressions += regression
+    return 1 if regressions > 0 else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : annotation-generator-batch.py                          #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import argparse
+import logging
+import sys
+from ang.Batch import expand_inputs, run_batch
+
+__author__ = 'Viktor Richter'
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description='Generate annotations for many metadata recordings in parallel.')
+    parser.add_argument('inputs', type=str, nargs='+',
+                        help='Input files or glob patterns.')
+    parser.add_argument('-o', '--output', type=str, required=True,
+                        help='Output file name template. Available fields: {path}, {dir}, {basename}, {name}, {ext}. '
+                             'Example: "{dir}/{name}.eaf"')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='Number of worker processes. Defaults to the number of cpus.')
+    parser.add_argument('-c', '--config', type=str, default=None, help='Use provided config file.')
+    parser.add_argument('-v', '--override-config', type=str, metavar=('SECTION', 'OPTION', 'VALUE'), nargs=3,
+                        default=[], action='append', help='Override options from config.')
+    args = parser.parse_args(arguments)
+
+    inputs = expand_inputs(args.inputs)
+    results, summary = run_batch(args.config, args.override_config, inputs, args.output, args.jobs)
+    logging.info('processed {files} files in {seconds:.2f}s: {succeeded} succeeded, {failed} failed. '
+                 '{files_per_second:.2f} files/s, {megabytes_per_second:.2f} MB/s'.format(**summary))
+    for failure in summary['failures']:
+        logging.error('failed: {}'.format(failure))
+    return 1 if summary['failed'] > 0 else 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    for logger in ['rsb.transport.socket.BusConnection']:
+        logging.getLogger(logger).setLevel(logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
@@ -24,7 +24,7 @@ import logging
 import sys
 from ang.Config import Config, default_config
 from ang.AnnotationGenerator import AnnotationGenerator
-from ang.AnnotationGenerator import update_callback_print
+from ang.Progress import TerminalRenderer
 
 __author__ = 'Viktor Richter'
 
@@ -57,8 +57,9 @@ def main(arguments):
 
     generator = AnnotationGenerator(config)
     generator.validate_setup()
-    data = generator.read_all_data(update_callback_print)
-    generator.process_data(data)
+    renderer = TerminalRenderer()
+    generator.run(renderer)
+    renderer.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : annotation-index.py                                    #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import argparse
+import logging
+import sys
+from ang.Batch import expand_inputs, load_config
+from ang.AnnotationGenerator import build_channel_index
+
+__author__ = 'Viktor Richter'
+
+
+def main(arguments):
+    parser = argparse.ArgumentParser(description='Build the channel index next to metadata recordings. '
+                                                 'Later runs use it to only read channels with handlers.')
+    parser.add_argument('inputs', type=str, nargs='+',
+                        help='Input files or glob patterns.')
+    parser.add_argument('-c', '--config', type=str, default=None, help='Use input options of provided config file.')
+    parser.add_argument('-v', '--override-config', type=str, metavar=('SECTION', 'OPTION', 'VALUE'), nargs=3,
+                        default=[], action='append', help='Override options from config.')
+    args = parser.parse_args(arguments)
+
+    for input_file in expand_inputs(args.inputs):
+        config = load_config(args.config, args.override_config)
+        config.set('base', 'input-file', input_file)
+        index, filename = build_channel_index(config)
+        print '{}: {} events in {} channels'.format(filename, index.count(), len(index.names()))
+        for name in index.names():
+            entry = index.channels[name]
+            print '  {}: {} events, {:.3f}s - {:.3f}s, {} bytes, {} chunks'.format(
+                name, entry['count'], entry['first'], entry['last'], entry['bytes'], len(entry['chunks']))
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    for logger in ['rsb.transport.socket.BusConnection']:
+        logging.getLogger(logger).setLevel(logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
@@ -22,36 +22,101 @@ import logging
 import json
 from rstsandbox.hri.PersonHypotheses_pb2 import PersonHypotheses
 from ang.rsbhelpers import RstBaseHandler
+from ang.Tier import to_nanoseconds, to_timedelta
+from ang.Trajectory import TrajectoryStore
 
 __author__ = 'Viktor Richter'
 
 logger = logging.getLogger(__name__)
 
 
+def as_label(state):
+    return [dict(id=id, location=dict(x=x, y=y, z=z, frame_id=frame_id)) for id, x, y, z, frame_id in state]
+
+
 class Handler(RstBaseHandler):
     def __init__(self, config):
         RstBaseHandler.__init__(self, PersonHypotheses)
         self.__config = config
+        # the tier with all persons per event as label is only kept when configured
         self.__tier = config.get('tier')
+        # presence tiers per tracking id are only kept when configured, e.g. 'person {}'
+        self.__presence_tier = config.get('presence-tier')
+        self.__presence_gap = to_nanoseconds(float(config.get('presence-gap-ms', 1000)) / 1000)
+        self.__trajectory_file = config.get('trajectory-file')
+        self.__store = TrajectoryStore()
+        # tracking id -> [presence start, time the person was first missing or None]
+        self.__present = {}
 
     def add_event(self, event):
         data, time = self.read_event(event)
-        persons = []
+        nanoseconds = to_nanoseconds(time)
+        ids = set()
         for person in data.persons:
-            persons.append(dict(id=person.tracking_info.id,
-                                location=dict(
-                                    x=person.body.location.x,
-                                    y=person.body.location.y,
-                                    z=person.body.location.z,
-                                    frame_id = person.body.location.frame_id
-                                )))
-        self.add_entry(self.__tier, dict(start=time, label=persons))
+            location = person.body.location
+            self.__store.add(person.tracking_info.id, nanoseconds, location.x, location.y, location.z,
+                             location.frame_id)
+            ids.add(person.tracking_info.id)
+        if self.__presence_tier is not None:
+            self.__update_presence(nanoseconds, ids)
+        if self.__tier is not None:
+            # the label is only built when the persons changed
+            state = tuple((person.tracking_info.id,
+                           person.body.location.x,
+                           person.body.location.y,
+                           person.body.location.z,
+                           person.body.location.frame_id) for person in data.persons)
+            self.add_state(self.__tier, time, state, lambda: as_label(state))
+
+    def __update_presence(self, time, ids):
+        for id in ids:
+            presence = self.__present.get(id)
+            if presence is None:
+                self.__present[id] = [time, None]
+            elif presence[1] is not None:
+                if time - presence[1] > self.__presence_gap:
+                    self.__add_presence(id, presence)
+                    self.__present[id] = [time, None]
+                else:
+                    presence[1] = None
+        for id, presence in self.__present.items():
+            if id in ids:
+                continue
+            if presence[1] is None:
+                presence[1] = time
+            elif time - presence[1] > self.__presence_gap:
+                self.__add_presence(id, presence)
+                del self.__present[id]
+
+    def __add_presence(self, id, presence):
+        # persons still present at the end get an open end
+        end = to_timedelta(presence[1]) if presence[1] is not None else None
+        self.add_entry(self.__presence_tier.format(id), dict(start=to_timedelta(presence[0]), end=end, label=id),
+                       combine_repeated=False, override_last_end=False)
+
+    def statistics(self):
+        statistics = RstBaseHandler.statistics(self)
+        statistics.update(tracks=len(self.__store.tracks()), samples=self.__store.samples())
+        return statistics
 
     def validate_setup(self):
         if self.__config is None:
             raise Exception(__name__ + ' needs a valid config. Config: {}'.format(self.__config))
 
+    def supports_shards(self):
+        # the trajectory file needs all samples. a window does not know whether a person was missing
+        # for presence-gap-ms at its edges
+        return self.__trajectory_file is None and self.__presence_tier is None
+
     def finish(self):
+        for id, presence in sorted(self.__present.iteritems()):
+            self.__add_presence(id, presence)
+        self.__present = {}
+        if self.__trajectory_file is not None:
+            self.__store.write(self.__trajectory_file)
+            logger.info('wrote {} samples of {} tracks to {}'.format(self.__store.samples(),
+                                                                     len(self.__store.tracks()),
+                                                                     self.__trajectory_file))
         return self.entries()
 
 
@@ -0,0 +1,146 @@
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : plugins/handler/rsb_protobuf_fields.py                 #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+
+
+import logging
+import importlib
+from operator import attrgetter
+from google.protobuf.descriptor import FieldDescriptor
+from ang.rsbhelpers import RstBaseHandler
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+# example config:
+# {'name': 'rsb_protobuf_fields', 'channel': '^/evidence/',
+#  'type': 'rst.bayesnetwork.BayesNetworkEvidence_pb2.BayesNetworkEvidence',
+#  'fields': {'variables': 'observations[].variable'},
+#  'maps': [{'items': 'observations', 'key': 'variable', 'value': 'state', 'tiers': {'variable0': 'ev0'}}]}
+# fields: tier -> path of the label. 'a[].b' reads b of every item of the repeated field a as a tuple
+# maps: every item of a repeated field sets the tier selected by its key. without 'tiers' the tier is
+#       'prefix' followed by the key. enum values are read as their names
+
+
+def import_type(path):
+    module, _, name = (path or '').rpartition('.')
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError, ValueError) as error:
+        raise Exception('could not import protobuf type "{}": {}'.format(path, error))
+
+
+def find_field(descriptor, names, path):
+    field = None
+    for name in names:
+        if descriptor is None:
+            raise Exception('{} is not a message in path {}'.format(field.name, path))
+        if field is not None and field.label == FieldDescriptor.LABEL_REPEATED:
+            raise Exception('repeated field {} needs [] in path {}'.format(field.name, path))
+        field = descriptor.fields_by_name.get(name)
+        if field is None:
+            raise Exception('{} has no field {} in path {}'.format(descriptor.full_name, name, path))
+        descriptor = field.message_type
+    return field
+
+
+def enum_names(field):
+    if field.enum_type is None:
+        return None
+    return dict((number, value.name) for number, value in field.enum_type.values_by_number.iteritems())
+
+
+def compile_path(descriptor, path):
+    # returns a function reading path from a message of the descriptor's type
+    head, repeated, rest = path.partition('[]')
+    names = head.strip('.').split('.')
+    field = find_field(descriptor, names, path)
+    is_repeated = field.label == FieldDescriptor.LABEL_REPEATED
+    if is_repeated != bool(repeated):
+        raise Exception('{} {} repeated in path {}'.format(field.name, 'is' if is_repeated else 'is not', path))
+    getter = attrgetter('.'.join(names))
+    if repeated:
+        if rest.strip('.'):
+            inner = compile_path(field.message_type, rest.strip('.'))
+        else:
+            names = enum_names(field)
+            if names is None:
+                return lambda message: tuple(getter(message))
+            inner = names.get
+        return lambda message: tuple(map(inner, getter(message)))
+    names = enum_names(field)
+    if names is None:
+        return getter
+    return lambda message: names.get(getter(message))
+
+
+def compile_map(descriptor, config):
+    # (items, key, value, key -> tier or None, prefix)
+    items = config['items']
+    item_descriptor = find_field(descriptor, items.split('.'), items).message_type
+    if item_descriptor is None:
+        raise Exception('{} are not messages'.format(items))
+    return (compile_path(descriptor, items + '[]'),
+            compile_path(item_descriptor, config['key']),
+            compile_path(item_descriptor, config['value']),
+            config.get('tiers'),
+            config.get('prefix', ''))
+
+
+class Handler(RstBaseHandler):
+    def __init__(self, config):
+        self.__type = import_type(config.get('type'))
+        RstBaseHandler.__init__(self, self.__type)
+        self.__config = config
+        descriptor = self.__type.DESCRIPTOR
+        # field paths are compiled once. events only call the accessors
+        self.__fields = [(tier, compile_path(descriptor, path))
+                         for tier, path in sorted(config.get('fields', {}).iteritems())]
+        self.__maps = [compile_map(descriptor, map_config) for map_config in config.get('maps', [])]
+        self.__warned_ignored = set()
+
+    def add_event(self, event):
+        data, time = self.read_event(event)
+        for tier, accessor in self.__fields:
+            self.add_entry(tier, dict(start=time, label=accessor(data)))
+        for items, key, value, tiers, prefix in self.__maps:
+            for item in items(data):
+                name = key(item)
+                if tiers is None:
+                    tier = '{}{}'.format(prefix, name)
+                elif name in tiers:
+                    tier = tiers[name]
+                else:
+                    if name not in self.__warned_ignored:
+                        logger.info('ignoring key {}'.format(name))
+                        self.__warned_ignored.add(name)
+                    continue
+                self.add_entry(tier, dict(start=time, label=value(item)))
+
+    def validate_setup(self):
+        if len(self.__fields) == 0 and len(self.__maps) == 0:
+            raise Exception(__name__ + ' needs fields or maps in its config. Config: {}'.format(self.__config))
+
+    def finish(self):
+        return self.entries()
+
+
+def create(base_config, local_config):
+    return Handler(local_config)
@@ -18,7 +18,10 @@
 ###################################################################
 
 import os
+import re
+import datetime
 import rsbag
+from ang.ChannelIndex import ChannelIndex
 from rsb.converter import SchemaAndByteArrayConverter, PredicateConverterList
 
 __author__ = 'Viktor Richter'
@@ -41,6 +44,26 @@ def which(program):
     return None
 
 
+def event_time(event):
+    return datetime.timedelta(seconds=event.getMetaData().userTimes['rsbag:original_receive'])
+
+
+def first_index(events, time, low, high):
+    # index of the first event at or after time. every probe is a seek in the bag
+    while low < high:
+        middle = (low + high) // 2
+        if event_time(events[middle]) < time:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def event_range(events, start, end):
+    for index in xrange(start, end):
+        yield events[index]
+
+
 class RsbagInput(object):
     def __init__(self, filename, channel, executable):
         print "will filter for following channels",
@@ -55,13 +78,47 @@ class RsbagInput(object):
         converter.addConverter(SchemaAndByteArrayConverter(), wireSchemaPredicate=(lambda x: 5))
         self.__bag = None
         self.__bag = rsbag.openBag(filename, channels=channel, rsbag=rsbag_ex, converters=converter)
+        self.__range = None
+        self.__indexed = None
+        index = ChannelIndex.load(filename)
+        if index is not None:
+            patterns = [re.compile(pattern) for pattern in channel or []]
+            names = [name for name in index.names()
+                     if len(patterns) == 0 or any(pattern.search(name) for pattern in patterns)]
+            self.__indexed = index.time_range(names)
+
+    def set_time_range(self, start, end):
+        events = self.__bag.events
+        first = 0 if start is None else first_index(events, start, 0, len(events))
+        last = len(events) if end is None else first_index(events, end, first, len(events))
+        self.__range = (first, last)
+
+    def estimated_count(self):
+        # the bag knows its length without reading events
+        if self.__range is not None:
+            return self.__range[1] - self.__range[0]
+        return len(self.__bag.events)
 
     def events(self):
-        return self.__bag.events
+        # events are requested from the bag one at a time while iterating
+        if self.__range is not None:
+            return event_range(self.__bag.events, *self.__range)
+        return iter(self.__bag.events)
 
     def channel(self, event):
         return (event.scope.toString(), event.data[0])
 
+    def event_size(self, event):
+        return len(event.data[1])
+
+    def time_range(self):
+        if self.__indexed is not None:
+            return datetime.timedelta(seconds=self.__indexed[0]), datetime.timedelta(seconds=self.__indexed[1])
+        events = self.__bag.events
+        if len(events) == 0:
+            return None
+        return event_time(events[0]), event_time(events[len(events) - 1])
+
     def __enter__(self):
         self.__bag.__enter__()
         return self
@@ -0,0 +1,146 @@
+###################################################################
+#                                                                 #
+# Copyright (C) 2017 Viktor Richter                               #
+#                                                                 #
+# File   : plugins/input/rsb_live/__init__.py                     #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import re
+import time
+import Queue
+import logging
+import rsb
+from rsb.converter import SchemaAndByteArrayConverter, PredicateConverterList
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+# characters that end the literal part of a channel pattern
+PATTERN_SPECIAL = re.compile(r'[\\.^$*+?{}\[\]|()]')
+
+
+def channel_scope(channel):
+    # the scope a listener needs to receive all events a channel pattern can match
+    if not channel.startswith('^'):
+        return '/'
+    literal = PATTERN_SPECIAL.split(channel[1:], 1)[0]
+    scope = literal[:literal.rfind('/') + 1]
+    return scope if scope.startswith('/') else '/'
+
+
+def listener_scopes(channels):
+    scopes = sorted(set(channel_scope(channel) for channel in channels or ['/']))
+    # listeners on a scope also receive the events of all sub scopes
+    return [scope for scope in scopes
+            if not any(scope != other and scope.startswith(other) for other in scopes)]
+
+
+def raw_converters():
+    converter = PredicateConverterList(bytearray)
+    converter.addConverter(SchemaAndByteArrayConverter(), wireSchemaPredicate=(lambda x: 5))
+    return converter
+
+
+class LiveEvents(object):
+    # iterates the received events until the duration is over or the user interrupts.
+    # yields None when no event arrived for heartbeat seconds so the reader can do periodic work.
+    def __init__(self, queue, heartbeat, duration):
+        self.__queue = queue
+        self.__heartbeat = heartbeat
+        self.__duration = duration
+
+    def __iter__(self):
+        end = None if self.__duration is None else time.time() + self.__duration
+        try:
+            while end is None or time.time() < end:
+                try:
+                    yield self.__queue.get(timeout=self.__heartbeat)
+                except Queue.Empty:
+                    yield None
+        except KeyboardInterrupt:
+            logger.info('stopped listening')
+
+
+class RsbLiveInput(object):
+    def __init__(self, scopes, queue_size, heartbeat, duration):
+        self.__scopes = scopes
+        self.__queue = Queue.Queue(queue_size)
+        self.__heartbeat = heartbeat
+        self.__duration = duration
+        self.__listeners = []
+
+    def __receive(self, event):
+        # handlers read the time from the rsbag meta data
+        event.getMetaData().setUserTime('rsbag:original_receive', event.getMetaData().getReceiveTime())
+        # blocks the receiving thread when the handlers fall behind
+        self.__queue.put(event)
+
+    def events(self):
+        return LiveEvents(self.__queue, self.__heartbeat, self.__duration)
+
+    def channel(self, event):
+        return (event.scope.toString(), event.data[0])
+
+    def event_size(self, event):
+        return len(event.data[1])
+
+    def time_range(self):
+        # the recording is not known in advance
+        return None
+
+    def __enter__(self):
+        config = rsb.getDefaultParticipantConfig()
+        converters = raw_converters()
+        for transport in config.getTransports():
+            transport.setConverters(converters)
+        for scope in self.__scopes:
+            listener = rsb.createListener(scope, config=config)
+            listener.addHandler(self.__receive)
+            self.__listeners.append(listener)
+        logger.info('listening on scopes {}'.format(self.__scopes))
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for listener in self.__listeners:
+            listener.deactivate()
+        self.__listeners = []
+
+    def validate_setup(self):
+        for scope in self.__scopes:
+            rsb.Scope(scope)
+
+
+def option(config, name, default):
+    value = config.get_optional('rsb-live', name)
+    if value is None:
+        return default
+    return type(default)(value)
+
+
+def create(config):
+    if config.get_optional('rsb-live', 'scopes') is not None:
+        scopes = config.get_eval('rsb-live', 'scopes')
+    else:
+        scopes = listener_scopes(config.get_eval('base', 'channel'))
+    # annotations start at the time the generator was started unless a start time is configured
+    if float(config.get('base', 'start-time-ms')) == 0:
+        config.set('base', 'start-time-ms', str(int(time.time() * 1000)))
+    duration = option(config, 'duration-s', 0.)
+    return RsbLiveInput(
+        scopes,
+        option(config, 'queue-size', 10000),
+        option(config, 'heartbeat-s', .5),
+        duration if duration > 0 else None)
@@ -0,0 +1,183 @@
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : plugins/input/synthetic/__init__.py                    #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import re
+import heapq
+import random
+import datetime
+from rsb import Event, Scope
+from google.protobuf.descriptor import FieldDescriptor
+from rstsandbox.hri.PersonHypotheses_pb2 import PersonHypotheses
+from rst.bayesnetwork.BayesNetworkEvidence_pb2 import BayesNetworkEvidence
+
+__author__ = 'Viktor Richter'
+
+PERSONS_SCOPE = '/synthetic/persons/{}/'
+EVIDENCE_SCOPE = '/synthetic/evidence/{}/'
+
+
+def wire_schema(typeobject):
+    return '.' + typeobject.DESCRIPTOR.full_name
+
+
+def variable_name(number):
+    return 'variable{}'.format(number)
+
+
+def state_name(number):
+    return 'state{}'.format(number)
+
+
+class PersonsSource(object):
+    def __init__(self, scope, persons, rng):
+        self.scope = scope
+        self.wire_schema = wire_schema(PersonHypotheses)
+        self.__rng = rng
+        self.__locations = [[rng.uniform(-5, 5), rng.uniform(-5, 5), 0.] for person in range(persons)]
+        id_field = PersonHypotheses().persons.add().tracking_info.DESCRIPTOR.fields_by_name['id']
+        self.__string_ids = id_field.cpp_type == FieldDescriptor.CPPTYPE_STRING
+
+    def payload(self):
+        data = PersonHypotheses()
+        for number, location in enumerate(self.__locations):
+            # random walk
+            location[0] += self.__rng.gauss(0, .05)
+            location[1] += self.__rng.gauss(0, .05)
+            person = data.persons.add()
+            person.tracking_info.id = str(number) if self.__string_ids else number
+            person.body.location.x = location[0]
+            person.body.location.y = location[1]
+            person.body.location.z = location[2]
+            person.body.location.frame_id = 'world'
+        return bytearray(data.SerializeToString())
+
+
+class EvidenceSource(object):
+    def __init__(self, scope, variables, states, change_probability, rng):
+        self.scope = scope
+        self.wire_schema = wire_schema(BayesNetworkEvidence)
+        self.__rng = rng
+        self.__states = states
+        self.__change_probability = change_probability
+        self.__current = [rng.randrange(states) for variable in range(variables)]
+
+    def payload(self):
+        data = BayesNetworkEvidence()
+        for variable, state in enumerate(self.__current):
+            if self.__rng.random() < self.__change_probability:
+                self.__current[variable] = self.__rng.randrange(self.__states)
+            observation = data.observations.add()
+            observation.variable = variable_name(variable)
+            observation.state = state_name(self.__current[variable])
+        return bytearray(data.SerializeToString())
+
+
+class SyntheticInput(object):
+    def __init__(self, channel, events, start_time, person_channels, person_rate, persons,
+                 evidence_channels, evidence_rate, variables, states, change_probability, seed):
+        self.__patterns = [re.compile(pattern) for pattern in channel or []]
+        self.__events = events
+        self.__start_time = start_time
+        self.__seed = seed
+        self.__sources = [(PERSONS_SCOPE.format(number), person_rate,
+                           lambda scope, rng: PersonsSource(scope, persons, rng))
+                          for number in range(person_channels)]
+        self.__sources += [(EVIDENCE_SCOPE.format(number), evidence_rate,
+                            lambda scope, rng: EvidenceSource(scope, variables, states, change_probability, rng))
+                           for number in range(evidence_channels)]
+
+    def __selected(self, scope, schema):
+        if len(self.__patterns) == 0:
+            return True
+        channel = '{}:{}'.format(scope, schema)
+        return any(pattern.search(channel) for pattern in self.__patterns)
+
+    def generate(self, payloads=True):
+        rng = random.Random(self.__seed)
+        queue = []
+        for number, (scope, rate, factory) in enumerate(self.__sources):
+            source = factory(scope, rng)
+            if self.__selected(source.scope, source.wire_schema):
+                # (next time, source number, period, source)
+                heapq.heappush(queue, (0., number, 1. / rate, source))
+        for count in range(self.__events):
+            if len(queue) == 0:
+                return
+            time, number, period, source = heapq.heappop(queue)
+            heapq.heappush(queue, (time + period, number, period, source))
+            yield Event(scope=Scope(source.scope),
+                        data=(source.wire_schema, source.payload() if payloads else None),
+                        userTimes={'rsbag:original_receive': self.__start_time + time})
+
+    def estimated_count(self):
+        return self.__events
+
+    def events(self):
+        return self.generate()
+
+    def channel(self, event):
+        return (event.scope.toString(), event.data[0])
+
+    def event_size(self, event):
+        return len(event.data[1])
+
+    def time_range(self):
+        first = last = None
+        for event in self.generate(payloads=False):
+            last = event.getMetaData().userTimes['rsbag:original_receive']
+            if first is None:
+                first = last
+        if first is None:
+            return None
+        return datetime.timedelta(seconds=first), datetime.timedelta(seconds=last)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    def validate_setup(self):
+        if self.__events < 0:
+            raise Exception('number of synthetic events must not be negative')
+        if len(self.__sources) == 0:
+            raise Exception('no synthetic channels configured')
+
+
+def option(config, name, default):
+    value = config.get_optional('synthetic', name)
+    if value is None:
+        return default
+    return type(default)(value)
+
+
+def create(config):
+    return SyntheticInput(
+        config.get_eval('base', 'channel'),
+        option(config, 'events', 10000),
+        option(config, 'start-time', 1500000000.),
+        option(config, 'person-channels', 1),
+        option(config, 'person-rate-hz', 30.),
+        option(config, 'persons', 3),
+        option(config, 'evidence-channels', 1),
+        option(config, 'evidence-rate-hz', 10.),
+        option(config, 'variables', 5),
+        option(config, 'states', 3),
+        option(config, 'change-probability', .05),
+        option(config, 'seed', 0))
@@ -0,0 +1,321 @@
+###################################################################
+#                                                                 #
+# Copyright (C) 2018 Viktor Richter                               #
+#                                                                 #
+# File   : plugins/input/tide/__init__.py                         #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import os
+import re
+import mmap
+import zlib
+import struct
+import logging
+import datetime
+from rsb import Event, Scope
+from ang.Tier import to_nanoseconds
+from ang.ChannelIndex import ChannelIndex
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+# a TIDE file is a sequence of blocks: 4 byte tag, uint64 length, body. all numbers are little endian.
+BLOCK_HEADER = struct.Struct('<4sQ')
+# TIDE: major version, minor version, number of channels, number of chunks
+FILE_HEADER = struct.Struct('<BBII')
+# INDX: channel id, number of entries, followed by (timestamp, offset) pairs
+INDEX_HEADER = struct.Struct('<IQ')
+# CHNK: chunk id, number of entries, first timestamp, last timestamp, compression, followed by the entries
+CHUNK_HEADER = struct.Struct('<IIQQB')
+# chunk entry: channel id, timestamp in nanoseconds, payload size, followed by the payload
+ENTRY_HEADER = struct.Struct('<IQI')
+UINT32 = struct.Struct('<I')
+
+# field number of the payload in rsb.protocol.Notification
+NOTIFICATION_DATA = 9
+
+
+def read_varint(data, offset):
+    result = 0
+    shift = 0
+    while True:
+        byte = ord(data[offset])
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return result, offset
+        shift += 7
+
+
+def skip_field(data, offset, wire_type):
+    if wire_type == 0:
+        return read_varint(data, offset)[1]
+    if wire_type == 1:
+        return offset + 8
+    if wire_type == 2:
+        length, offset = read_varint(data, offset)
+        return offset + length
+    if wire_type == 5:
+        return offset + 4
+    raise Exception('unsupported protobuf wire type {}'.format(wire_type))
+
+
+def find_fields(data, offset, end, numbers):
+    # walks the protobuf wire format and returns {number: (wire type, value offset, value end)}
+    found = {}
+    while offset < end:
+        key, offset = read_varint(data, offset)
+        number, wire_type = key >> 3, key & 7
+        value_offset = offset
+        if wire_type == 2:
+            length, value_offset = read_varint(data, offset)
+            offset = value_offset + length
+        else:
+            offset = skip_field(data, offset, wire_type)
+        if number in numbers:
+            found[number] = (wire_type, value_offset, offset)
+    return found
+
+
+def read_string(data, offset, end):
+    length = UINT32.unpack_from(data, offset)[0]
+    start = offset + UINT32.size
+    return data[start:min(start + length, end)], start + length
+
+
+class Channel(object):
+    def __init__(self, id, name, meta_data, payload):
+        self.id = id
+        self.name = name
+        self.meta_data = meta_data
+        # channel names are 'scope:wire-schema'
+        scope, _, self.wire_schema = name.partition(':')
+        self.scope = Scope(scope or '/')
+        if payload == 'auto':
+            self.notification = 'rsb-event' in meta_data.lower()
+        else:
+            self.notification = payload == 'notification'
+
+
+def channel_name(channel):
+    # same as the names in the channel index
+    return '{}:{}'.format(channel.scope.toString(), channel.wire_schema)
+
+
+class Chunk(object):
+    def __init__(self, offset, end, count, start, last, compression):
+        self.offset = offset
+        self.end = end
+        self.count = count
+        self.start = start
+        self.last = last
+        self.compression = compression
+
+
+class TideFile(object):
+    # scans the block structure once. payloads are only touched while iterating events between open() and close()
+    def __init__(self, filename, payload):
+        self.__filename = filename
+        self.__file = None
+        self.__map = None
+        self.version = None
+        self.channels = {}
+        self.chunks = []
+        self.index_counts = {}
+        self.open()
+        try:
+            self.__scan(payload)
+        finally:
+            self.close()
+
+    def open(self):
+        if self.__map is None:
+            self.__file = open(self.__filename, 'rb')
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __scan(self, payload):
+        data = self.__map
+        size = len(data)
+        offset = 0
+        while offset + BLOCK_HEADER.size <= size:
+            tag, length = BLOCK_HEADER.unpack_from(data, offset)
+            body = offset + BLOCK_HEADER.size
+            end = body + length
+            if end > size:
+                logger.warning('ignoring truncated {} block at offset {}'.format(tag, offset))
+                break
+            if tag == 'TIDE':
+                self.version = FILE_HEADER.unpack_from(data, body)[:2]
+            elif tag == 'CHAN':
+                id = UINT32.unpack_from(data, body)[0]
+                name, position = read_string(data, body + UINT32.size, end)
+                meta_data = read_string(data, position, end)[0] if position + UINT32.size <= end else ''
+                self.channels[id] = Channel(id, name, meta_data, payload)
+            elif tag == 'INDX':
+                channel_id, count = INDEX_HEADER.unpack_from(data, body)
+                self.index_counts[channel_id] = self.index_counts.get(channel_id, 0) + count
+            elif tag == 'CHNK':
+                chunk_id, count, start, last, compression = CHUNK_HEADER.unpack_from(data, body)
+                self.chunks.append(Chunk(body + CHUNK_HEADER.size, end, count, start, last, compression))
+            offset = end
+        self.chunks.sort(key=lambda chunk: chunk.start)
+
+    def chunk_entries(self, chunk):
+        # yields (channel id, timestamp, payload buffer) without copying uncompressed payloads
+        if chunk.compression == 0:
+            data, offset, end = self.__map, chunk.offset, chunk.end
+        else:
+            data = zlib.decompress(self.__map[chunk.offset:chunk.end])
+            offset, end = 0, len(data)
+        for entry in xrange(chunk.count):
+            if offset + ENTRY_HEADER.size > end:
+                logger.warning('chunk at offset {} ends after {} of {} entries'.format(chunk.offset, entry, chunk.count))
+                return
+            channel_id, timestamp, size = ENTRY_HEADER.unpack_from(data, offset)
+            offset += ENTRY_HEADER.size
+            yield channel_id, timestamp, buffer(data, offset, size)
+            offset += size
+
+    def close(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__file.close()
+            self.__map = None
+            self.__file = None
+
+
+def make_event(channel, timestamp, payload):
+    # the entry timestamp is the event time. seeking, the time range and the channel index use it as well
+    if channel.notification:
+        fields = find_fields(payload, 0, len(payload), (NOTIFICATION_DATA,))
+        if NOTIFICATION_DATA in fields:
+            _, start, end = fields[NOTIFICATION_DATA]
+            payload = buffer(payload, start, end - start)
+        else:
+            payload = buffer('')
+    return Event(scope=channel.scope,
+                 data=(channel.wire_schema, payload),
+                 userTimes={'rsbag:original_receive': timestamp / 1e9})
+
+
+class TideInput(object):
+    def __init__(self, filename, channel, payload):
+        if filename is None or not os.path.isfile(filename):
+            error = 'Input file "{}" does not exist or is not a regular file.'.format(filename)
+            raise Exception(error)
+        if payload not in ('auto', 'notification', 'raw'):
+            raise Exception('tide payload must be one of auto, notification or raw. Got "{}"'.format(payload))
+        self.__file = TideFile(filename, payload)
+        # entry timestamps in nanoseconds. entries outside are skipped before decoding
+        self.__start = None
+        self.__end = None
+        patterns = [re.compile(pattern) for pattern in channel or []]
+        self.__selected = dict((id, channel) for id, channel in self.__file.channels.iteritems()
+                               if len(patterns) == 0 or any(pattern.search(channel.name) for pattern in patterns))
+        logger.info('reading {} of {} channels: {}'.format(len(self.__selected), len(self.__file.channels),
+                                                           sorted(c.name for c in self.__selected.itervalues())))
+        # offsets of the chunks with entries of the selected channels, when a channel index exists
+        self.__chunk_offsets = None
+        self.__indexed_count = None
+        index = ChannelIndex.load(filename)
+        if index is not None:
+            names = [channel_name(channel) for channel in self.__selected.itervalues()]
+            names = [name for name in names if name in index.channels]
+            self.__chunk_offsets = index.chunks(names)
+            self.__indexed_count = index.count(names)
+
+    def set_time_range(self, start, end):
+        self.__start = None if start is None else to_nanoseconds(start)
+        self.__end = None if end is None else to_nanoseconds(end)
+
+    def chunks(self):
+        # chunks are sorted by their first timestamp
+        for chunk in self.__file.chunks:
+            if self.__end is not None and chunk.start >= self.__end:
+                break
+            if self.__start is not None and chunk.last < self.__start:
+                continue
+            if self.__chunk_offsets is not None and chunk.offset not in self.__chunk_offsets:
+                continue
+            yield chunk
+
+    def index_entries(self):
+        # (channel, time, size, chunk offset) of all entries without decoding them
+        for chunk in self.chunks():
+            for channel_id, timestamp, payload in self.__file.chunk_entries(chunk):
+                channel = self.__selected.get(channel_id)
+                if channel is not None:
+                    yield (channel.scope.toString(), channel.wire_schema), timestamp / 1e9, len(payload), chunk.offset
+
+    def generate(self):
+        selected = self.__selected
+        start = self.__start
+        end = self.__end
+        for chunk in self.chunks():
+            for channel_id, timestamp, payload in self.__file.chunk_entries(chunk):
+                if (start is not None and timestamp < start) or (end is not None and timestamp >= end):
+                    continue
+                channel = selected.get(channel_id)
+                if channel is not None:
+                    yield make_event(channel, timestamp, payload)
+
+    def estimated_count(self):
+        if self.__file.index_counts:
+            count = sum(self.__file.index_counts.get(id, 0) for id in self.__selected)
+        elif self.__indexed_count is not None:
+            count = self.__indexed_count
+        else:
+            count = sum(chunk.count for chunk in self.__file.chunks)
+        if self.__start is None and self.__end is None:
+            return count
+        # estimated by the share of entries in the chunks within the time range
+        total = sum(chunk.count for chunk in self.__file.chunks)
+        return count * sum(chunk.count for chunk in self.chunks()) / max(total, 1)
+
+    def events(self):
+        return self.generate()
+
+    def channel(self, event):
+        return (event.scope.toString(), event.data[0])
+
+    def event_size(self, event):
+        return len(event.data[1])
+
+    def time_range(self):
+        if len(self.__file.chunks) == 0:
+            return None
+        return (datetime.timedelta(microseconds=min(chunk.start for chunk in self.__file.chunks) / 1e3),
+                datetime.timedelta(microseconds=max(chunk.last for chunk in self.__file.chunks) / 1e3))
+
+    def __enter__(self):
+        self.__file.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__file.close()
+
+    def validate_setup(self):
+        if self.__file.version is None:
+            raise Exception('input file has no TIDE header block')
+        if len(self.__selected) == 0:
+            logger.warning('no channel of the input file matches the configured channels')
+
+
+def create(config):
+    return TideInput(
+        config.get('base', 'input-file'),
+        config.get_eval('base', 'channel'),
+        config.get_optional('tide', 'payload') or 'auto')
@@ -20,9 +20,15 @@
 ###################################################################
 
 import logging
-import pympi
 import os
 import datetime
+from ang.Eaf import EafWriter
+from ang.Tier import Tier
+
+try:
+    import pympi
+except ImportError:
+    pympi = None
 
 __author__ = 'Viktor Richter'
 
@@ -42,42 +48,114 @@ def validate(data):
         raise Exception('ElanOutput expects a each data point to have an "end" element.')
     if 'label' not in data:
         raise Exception('ElanOutput expects a each data point to have a "label" element.')
-    start = as_elan_time(data['start'])
-    end = as_elan_time(data['end'])
+
+
+def validate_times(start, end):
+    if end is None:
+        raise Exception('ElanOutput expects a each data point to have an "end" element.')
     if end <= start:
         raise Exception('ElanOutput expects a start times to be smaller than end times. Got {} >= {}'
                         .format(start, end))
 
 
+def as_elan_entry(annotation):
+    validate(annotation)
+    entry = as_elan_time(annotation['start']), as_elan_time(annotation['end']), annotation['label']
+    validate_times(entry[0], entry[1])
+    return entry
+
+
+def as_checked_entry(entry):
+    validate_times(entry[0], entry[1])
+    return entry
+
+
+def elan_entries(annotations):
+    # tiers provide (start, end, label) in elan time without creating timedeltas
+    if isinstance(annotations, Tier):
+        return annotations.iter_ms(), as_checked_entry
+    return annotations, as_elan_entry
+
+
+class PympiDocument(object):
+    # builds the whole document in memory before writing it
+    def __init__(self, filename):
+        self.__document = pympi.Eaf()
+        self.__filename = filename
+
+    def add_tier(self, tier_name):
+        if tier_name not in self.__document.tiers:
+            self.__document.add_tier(tier_name)
+
+    def add_annotation(self, tier_name, start, end, value):
+        self.add_tier(tier_name)
+        self.__document.add_annotation(tier_name, start, end, str(value))
+
+    def write(self):
+        self.__document.to_file(self.__filename, True)
+
+    def close(self):
+        self.write()
+
+
+WRITERS = {
+    'stream': EafWriter,
+    'pympi': PympiDocument,
+}
+
+
 class ElanOutput(object):
+    kind = 'sink'
+
     def __init__(self, filename, config):
-        self.__document = pympi.Eaf()
+        self.__document = None
         self.__filename = filename
         self.__overwrite = bool(config.get('overwrite-output', False))
+        self.__writer = config.get('writer', 'stream')
+
+    def __add(self, tier_name, start, end, label):
+        self.__document.add_annotation(tier_name, start, end, label)
 
     def process(self, tiers):
         if not isinstance(tiers, dict):
             raise Exception('ElanOutput expects a dict of tiers but got :', type(tiers))
+        self.open_stream()
         for tier_name, annotations in tiers.iteritems():
             num = 0
-            for annotation in annotations:
+            entries, as_entry = elan_entries(annotations)
+            for entry in entries:
                 num +=1
                 try:
-                    validate(annotation)
-                    if tier_name not in self.__document.get_tier_names():
-                        self.__document.add_tier(tier_name)
-                    self.__document.add_annotation(tier_name,
-                                                   as_elan_time(annotation['start']),
-                                                   as_elan_time(annotation['end']),
-                                                   str(annotation['label']))
+                    self.__add(tier_name, *as_entry(entry))
                 except Exception as e:
                     logger.warning('Cannot add annotation {} from tier {}: {}'.format(num, tier_name, e))
-        self.__document.to_file(self.__filename, True)
+        self.close_stream()
         return tiers
 
+    def open_stream(self):
+        self.__document = WRITERS[self.__writer](self.__filename)
+
+    def add_annotation(self, tier_name, annotation):
+        try:
+            self.__add(tier_name, *as_elan_entry(annotation))
+        except Exception as e:
+            logger.warning('Cannot add annotation {} to tier {}: {}'.format(annotation, tier_name, e))
+
+    def flush_stream(self):
+        # writes a complete document with the annotations streamed so far
+        self.__document.write()
+
+    def close_stream(self):
+        self.__document.close()
+        self.__document = None
+
     def validate_setup(self):
         if self.__filename is None or len(self.__filename) == 0:
             raise Exception('filename is None or empty')
+        if self.__writer not in WRITERS:
+            raise Exception('unknown writer {}. available writers: {}'.format(self.__writer, WRITERS.keys()))
+        if self.__writer == 'pympi' and pympi is None:
+            raise Exception('the pympi writer needs pympi-ling to be installed')
         if os.path.exists(self.__filename) and not self.__overwrite:
             raise Exception('file {} already exists'.format(self.__filename))
         with open(self.__filename, 'w'):
@@ -85,4 +163,5 @@ class ElanOutput(object):
 
 
 def create(base_config, local_config):
-    return ElanOutput(base_config.output_file(),local_config)
+    # every output may write its own file
+    return ElanOutput(local_config.get('output-file', base_config.output_file()), local_config)
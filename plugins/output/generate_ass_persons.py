@@ -20,10 +20,11 @@
 ###################################################################
 
 import logging
-import pympi
 import os
 import datetime
 import json
+from ang.Ndjson import NdjsonWriter
+from ang.Tier import Tier, to_timedelta
 
 __author__ = 'Viktor Richter'
 
@@ -50,33 +51,118 @@ def validate(data):
                         .format(start, end))
 
 
+def as_document_entry(tier_name, annotation):
+    return {'start': as_timestamp(annotation['start']),
+            'end': as_timestamp(annotation['end']),
+            tier_name: annotation['label']}
+
+
+def tier_document_entries(tier_name, tier):
+    # fast path for tiers. times are compared in nanoseconds like validate does for timedeltas
+    num = 0
+    for start, end, label in tier.iter_ns():
+        num += 1
+        if end is None or end <= start:
+            logger.warning('Cannot add annotation {} from tier {}: start {} is not before end {}'
+                           .format(num, tier_name, to_timedelta(start), end if end is None else to_timedelta(end)))
+            continue
+        yield {'start': start // 1000000, 'end': end // 1000000, tier_name: label}
+
+
+def as_flag(value):
+    # options may be given as booleans or as strings like 'False'
+    return str(value).lower() in ('true', '1', 'yes')
+
+
+def dump_json(data, outfile):
+    json.dump(data, outfile, sort_keys=True, indent=4, separators=(',', ': '))
+
+
 class AssOutput(object):
+    kind = 'sink'
+
     def __init__(self, filename, config):
         self.__document = []
         self.__filename = filename
         self.__overwrite = bool(config.get('overwrite-output', False))
+        # 'json' writes one indented list, 'ndjson' one compact object per line
+        self.__format = config.get('format', 'json')
+        self.__compress = as_flag(config.get('compress', False)) or (filename or '').endswith('.gz')
+        self.__stream = None
+        self.__streamed = 0
 
     def process(self, tiers):
         if not isinstance(tiers, dict):
             raise Exception('ElanOutput expects a dict of tiers but got :', type(tiers))
+        if self.__format == 'ndjson':
+            # entries are written as they are converted
+            self.open_stream()
+            for tier_name, annotations in tiers.iteritems():
+                for entry in self.__document_entries(tier_name, annotations):
+                    self.__stream.write(entry)
+            self.close_stream()
+            return {}
         for tier_name, annotations in tiers.iteritems():
-            num = 0
-            for annotation in annotations:
-                num +=1
-                try:
-                    validate(annotation)
-                    self.__document.append({ 'start': as_timestamp(annotation['start']),
-                                             'end': as_timestamp(annotation['end']),
-                                             tier_name: annotation['label']})
-                except Exception as e:
-                    logger.warning('Cannot add annotation {} from tier {}: {}'.format(num, tier_name, e))
+            self.__document.extend(self.__document_entries(tier_name, annotations))
         with open(self.__filename, 'w') as outfile:
-            json.dump(self.__document, outfile, sort_keys=True, indent=4, separators=(',', ': '))
+            dump_json(self.__document, outfile)
         return {}
 
+    @staticmethod
+    def __document_entries(tier_name, annotations):
+        if isinstance(annotations, Tier):
+            for entry in tier_document_entries(tier_name, annotations):
+                yield entry
+            return
+        num = 0
+        for annotation in annotations:
+            num +=1
+            try:
+                validate(annotation)
+            except Exception as e:
+                logger.warning('Cannot add annotation {} from tier {}: {}'.format(num, tier_name, e))
+                continue
+            yield as_document_entry(tier_name, annotation)
+
+    # the streaming interface writes the same document entry by entry
+    def open_stream(self):
+        self.__streamed = 0
+        if self.__format == 'ndjson':
+            self.__stream = NdjsonWriter(self.__filename, self.__compress)
+            return
+        self.__stream = open(self.__filename, 'w')
+        self.__stream.write('[')
+
+    def add_annotation(self, tier_name, annotation):
+        try:
+            validate(annotation)
+        except Exception as e:
+            logger.warning('Cannot add annotation {} from tier {}: {}'.format(annotation, tier_name, e))
+            return
+        if self.__format == 'ndjson':
+            self.__stream.write(as_document_entry(tier_name, annotation))
+            return
+        self.__stream.write(',\n' if self.__streamed > 0 else '\n')
+        dump_json(as_document_entry(tier_name, annotation), self.__stream)
+        self.__streamed += 1
+
+    def flush_stream(self):
+        # the ndjson format is readable up to the last line, the json list only after closing
+        self.__stream.flush()
+
+    def close_stream(self):
+        if self.__format != 'ndjson':
+            self.__stream.write('\n]' if self.__streamed > 0 else ']')
+        self.__stream.close()
+        self.__stream = None
+
     def validate_setup(self):
         if self.__filename is None or len(self.__filename) == 0:
             raise Exception('filename is None or empty')
+        if self.__format not in ('json', 'ndjson'):
+            raise Exception('unknown format {}. use json or ndjson'.format(self.__format))
+        if self.__compress and self.__format != 'ndjson':
+            raise Exception('compress is only available with the ndjson format')
         if os.path.exists(self.__filename) and not self.__overwrite:
             raise Exception('file {} already exists'.format(self.__filename))
         with open(self.__filename, 'w'):
@@ -84,4 +170,5 @@ class AssOutput(object):
 
 
 def create(base_config, local_config):
-    return AssOutput(base_config.output_file(),local_config)
+    # every output may write its own file
+    return AssOutput(local_config.get('output-file', base_config.output_file()), local_config)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+###################################################################
+#                                                                 #
+# Copyright (C) 2017 Viktor Richter                               #
+#                                                                 #
+# File   : plugins/output/postprocess/__init__.py                 #
+# Authors: Viktor Richter                                         #
+#                                                                 #
+#                                                                 #
+# GNU LESSER GENERAL PUBLIC LICENSE                               #
+# This file may be used under the terms of the GNU Lesser General #
+# Public License version 3.0 as published by the                  #
+#                                                                 #
+# Free Software Foundation and appearing in the file LICENSE.LGPL #
+# included in the packaging of this file.  Please review the      #
+# following information to ensure the license requirements will   #
+# be met: http://www.gnu.org/licenses/lgpl-3.0.txt                #
+#                                                                 #
+###################################################################
+
+import re
+import logging
+from ang.Tier import Tier, OPEN, as_tiers
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__author__ = 'Viktor Richter'
+
+logger = logging.getLogger(__name__)
+
+# label id of samples between segments
+GAP = -1
+# majority voting runs once per distinct label
+MAX_VOTE_LABELS = 256
+
+
+def ms_option(config, name):
+    # milliseconds as nanoseconds. None when not set
+    value = config.get(name)
+    return None if value is None else int(float(value) * 10 ** 6)
+
+
+def tier_arrays(tier):
+    # (starts, ends, label ids) in nanoseconds sorted by start. None when the tier has open ends
+    starts, ends, label_ids, offset = tier.columns()
+    ends = numpy.frombuffer(ends, dtype=numpy.int64)
+    if (ends == OPEN).any():
+        return None
+    starts = numpy.frombuffer(starts, dtype=numpy.int64)
+    label_ids = numpy.frombuffer(label_ids, dtype=numpy.int64)
+    order = numpy.argsort(starts, kind='mergesort')
+    return starts[order] + offset, ends[order] + offset, label_ids[order]
+
+
+def as_tier(starts, ends, label_ids, labels):
+    return Tier.from_columns(starts.astype(numpy.int64).tostring(), ends.astype(numpy.int64).tostring(),
+                             label_ids.astype(numpy.int64).tostring(), labels)
+
+
+def drop_short(starts, ends, label_ids, min_duration):
+    keep = ends - starts >= min_duration
+    return starts[keep], ends[keep], label_ids[keep]
+
+
+def merge_gaps(starts, ends, label_ids, max_gap):
+    # joins consecutive segments with the same label which are at most max_gap apart
+    if len(starts) == 0:
+        return starts, ends, label_ids
+    joined = numpy.zeros(len(starts), dtype=bool)
+    joined[1:] = (label_ids[1:] == label_ids[:-1]) & (starts[1:] - ends[:-1] <= max_gap)
+    first = numpy.flatnonzero(~joined)
+    return starts[first], numpy.maximum.reduceat(ends, first), label_ids[first]
+
+
+def sample(starts, ends, label_ids, step):
+    # (times, label id at each time or GAP) on a grid of step nanoseconds. segments are painted in order,
+    # so later segments win where they overlap and earlier ones show again after them
+    first = starts[0] - starts[0] % step
+    times = numpy.arange(first, ends.max(), step, dtype=numpy.int64)
+    samples = numpy.full(len(times), GAP, dtype=numpy.int64)
+    # grid indices of the first sample in and the first sample after each segment
+    low = (starts - first + step - 1) // step
+    high = (ends - first + step - 1) // step
+    for segment in xrange(len(starts)):
+        samples[low[segment]:high[segment]] = label_ids[segment]
+    return times, samples
+
+
+def segments(times, samples, step):
+    # turns runs of equal samples back into segments. a run ends where the next one starts
+    if len(samples) == 0:
+        # only zero length segments were sampled
+        return times, times, samples
+    change = numpy.flatnonzero(samples[1:] != samples[:-1]) + 1
+    first = numpy.concatenate(([0], change))
+    last = numpy.concatenate((change, [len(samples)]))
+    ends = numpy.append(times, times[-1] + step)[last]
+    keep = samples[first] != GAP
+    return times[first][keep], ends[keep], samples[first][keep]
+
+
+def majority(samples, width):
+    # the most frequent label id within width samples around every sample. ties keep the own label
+    values, codes = numpy.unique(samples, return_inverse=True)
+    positions = numpy.arange(len(samples))
+    low = numpy.maximum(positions - width // 2, 0)
+    high = numpy.minimum(positions + width // 2 + 1, len(samples))
+    best = numpy.zeros(len(samples), dtype=numpy.int64)
+    best_count = numpy.full(len(samples), -1, dtype=numpy.int64)
+    own_count = numpy.zeros(len(samples), dtype=numpy.int64)
+    for code in xrange(len(values)):
+        matches = codes == code
+        counts = numpy.concatenate(([0], numpy.cumsum(matches)))
+        window = counts[high] - counts[low]
+        better = window > best_count
+        best[better] = code
+        best_count[better] = window[better]
+        own_count[matches] = window[matches]
+    return values[numpy.where(own_count == best_count, codes, best)]
+
+
+class PostprocessOutput(object):
+    # cleans the selected tiers and passes all tiers on. applies resampling and majority voting,
+    # then drops short segments and merges the remaining ones across small gaps
+    kind = 'transform'
+
+    def __init__(self, config):
+        self.__patterns = [re.compile(pattern) for pattern in config.get('tiers', [])]
+        self.__min_duration = ms_option(config, 'min-duration-ms')
+        self.__merge_gap = ms_option(config, 'merge-gap-ms')
+        self.__majority_window = ms_option(config, 'majority-window-ms')
+        self.__step = ms_option(config, 'resample-ms')
+        if self.__step is None and self.__majority_window is not None:
+            self.__step = max(self.__majority_window // 10, 10 ** 6)
+
+    def __selected(self, tier_name):
+        return len(self.__patterns) == 0 or any(pattern.search(tier_name) for pattern in self.__patterns)
+
+    def process_tier(self, tier_name, tier):
+        arrays = tier_arrays(tier)
+        if arrays is None:
+            logger.warning('not processing tier {} because it has annotations without end'.format(tier_name))
+            return tier
+        starts, ends, label_ids = arrays
+        if self.__step is not None:
+            times, samples = sample(starts, ends, label_ids, self.__step)
+            if self.__majority_window is not None:
+                if len(tier.labels()) > MAX_VOTE_LABELS:
+                    logger.warning('not smoothing tier {} with {} labels'.format(tier_name, len(tier.labels())))
+                else:
+                    samples = majority(samples, max(1, self.__majority_window // self.__step) | 1)
+            starts, ends, label_ids = segments(times, samples, self.__step)
+        if self.__min_duration is not None:
+            starts, ends, label_ids = drop_short(starts, ends, label_ids, self.__min_duration)
+        if self.__merge_gap is not None:
+            starts, ends, label_ids = merge_gaps(starts, ends, label_ids, self.__merge_gap)
+        return as_tier(starts, ends, label_ids, tier.labels())
+
+    def process(self, tiers):
+        if not isinstance(tiers, dict):
+            raise Exception('PostprocessOutput expects a dict of tiers but got :', type(tiers))
+        result = {}
+        for tier_name, tier in as_tiers(tiers).iteritems():
+            if len(tier) == 0 or not self.__selected(tier_name):
+                result[tier_name] = tier
+                continue
+            result[tier_name] = self.process_tier(tier_name, tier)
+            logger.info('tier {}: {} -> {} annotations'.format(tier_name, len(tier), len(result[tier_name])))
+        return result
+
+    def validate_setup(self):
+        if numpy is None:
+            raise Exception('the postprocess output needs numpy to be installed')
+        for value in (self.__min_duration, self.__merge_gap, self.__majority_window, self.__step):
+            if value is not None and value < 0:
+                raise Exception('postprocess durations must not be negative')
+        if self.__step == 0:
+            raise Exception('resample-ms must be positive')
+
+
+def create(base_config, local_config):
+    return PostprocessOutput(local_config)